@@ -1,4 +1,5 @@
 import os
+import re
 import sys
 import streamlit as st
 import pandas as pd
@@ -17,7 +18,9 @@ project_root = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, project_root)
 
 from src.core.stock_data_fetcher import get_stock_list, get_stock_data
-from src.core.kmj_indicator import calculate_kmj_indicators, get_kmj_signals
+from src.core.kmj_indicator import calculate_kmj_indicators, calculate_kmj_indicators_batch, get_kmj_signals
+from src.core._njit import njit
+from src.utils.cache import FileCache, last_trade_date
 
 # 行业分类
 INDUSTRY_CATEGORIES = {
@@ -34,6 +37,57 @@ INDUSTRY_CATEGORIES = {
     '其他': ['综合']
 }
 
+# 行业大类下拉选项，模块加载时排好序
+INDUSTRY_CATEGORY_OPTIONS = ['全部'] + sorted(INDUSTRY_CATEGORIES)
+
+# 根据股票名称关键词推断行业，排在后面的规则优先级更高
+INDUSTRY_NAME_PATTERNS = [
+    ('银行', '银行'),
+    ('证券', '证券'),
+    ('保险', '保险'),
+    ('地产|房产|置业', '房地产'),
+    ('医药|生物|制药', '医药生物'),
+    ('通信|电信|移动', '通信'),
+    ('电子|芯片|半导体', '电子'),
+    ('软件|网络|计算机', '计算机'),
+]
+
+# 技术评分磁盘缓存，按股票代码+交易日存储，当日日线发布后评分不会再变化
+SCORE_CACHE = FileCache('scores')
+
+# 股票代码前三位 -> 所属板块
+PREFIX_TO_BOARD = {
+    '600': '上证主板',
+    '601': '上证主板',
+    '603': '上证主板',
+    '000': '深证主板',
+    '002': '中小板',
+    '300': '创业板',
+    '688': '科创板'
+}
+
+# 侧边栏板块选项 -> 包含的板块
+BOARD_GROUPS = {
+    '主板': {'上证主板', '深证主板'},
+    '创业板': {'创业板'},
+    '科创板': {'科创板'},
+    '中小板': {'中小板'}
+}
+
+# 板块下拉选项
+BOARD_OPTIONS = ['全部'] + list(BOARD_GROUPS)
+
+# 历史数据表格的列显示格式
+HISTORY_COLUMN_CONFIG = {
+    **{col: st.column_config.NumberColumn(format='%.2f') for col in ('open', 'high', 'low', 'close', 'KMJ1', 'KMJ2', 'KMJ3')},
+    'volume': st.column_config.TextColumn()
+}
+
+# 每组关键词放在一个可选的前瞻断言里，一次extract即可拿到所有命中的分组
+_INDUSTRY_NAME_REGEX = re.compile('^' + ''.join(
+    f'(?:(?=.*?(?P<g{i}>{pattern})))?' for i, (pattern, _) in enumerate(INDUSTRY_NAME_PATTERNS)
+))
+
 # 获取行业标准分类
 def get_industry_category(industry):
     """将行业名称映射到标准行业分类"""
@@ -47,6 +101,20 @@ def get_industry_category(industry):
                 return category
     return '其他'
 
+# 每个行业大类一个可选前瞻分组，按INDUSTRY_CATEGORIES的顺序取第一个命中的大类
+_INDUSTRY_CATEGORY_NAMES = list(INDUSTRY_CATEGORIES)
+_INDUSTRY_CATEGORY_REGEX = re.compile('^' + ''.join(
+    f"(?:(?=.*?(?P<c{i}>{'|'.join(re.escape(ind.lower()) for ind in industries)})))?"
+    for i, industries in enumerate(INDUSTRY_CATEGORIES.values())
+))
+
+def map_industry_categories(industries):
+    """批量将行业名称映射到标准行业分类，结果与get_industry_category逐个映射一致"""
+    matches = industries.fillna('').astype(str).str.lower().str.extract(_INDUSTRY_CATEGORY_REGEX)
+    conditions = [matches[f'c{i}'].notna().to_numpy() for i in range(len(_INDUSTRY_CATEGORY_NAMES))]
+    categories = np.select(conditions, _INDUSTRY_CATEGORY_NAMES, default='其他')
+    return pd.Series(categories, index=industries.index)
+
 # Page config
 st.set_page_config(
     page_title="自动选股系统",
@@ -78,6 +146,9 @@ def load_stock_list():
                 # 初始化技术分析得分
                 stocks_df['technical_score'] = 0.0
                 
+                # 代码前三位转为整数，前缀筛选改用整数比较
+                stocks_df['symbol_prefix'] = pd.to_numeric(stocks_df['symbol'].str[:3], errors='coerce').astype('Int16')
+                
                 # 标准化行业分类
                 if 'industry' in stocks_df.columns:
                     # 确保industry列存在，否则添加默认值
@@ -86,49 +157,19 @@ def load_stock_list():
                     # 为空行业添加基本分类（根据股票代码特征）
                     mask_unknown = stocks_df['industry'].isin(['其他', '未知']) | stocks_df['industry'].isna()
                     
-                    # 使用字符串方法而不是正则表达式进行匹配
-                    # 银行股
-                    bank_mask = mask_unknown & (
-                        stocks_df['symbol'].str.startswith(('600', '601'), na=False) & 
-                        stocks_df['name'].str.contains('银行', na=False)
-                    )
-                    stocks_df.loc[bank_mask, 'industry'] = '银行'
-                    
-                    # 券商股
-                    securities_mask = mask_unknown & stocks_df['name'].str.contains('证券', na=False)
-                    stocks_df.loc[securities_mask, 'industry'] = '证券'
-                    
-                    # 保险股
-                    insurance_mask = mask_unknown & stocks_df['name'].str.contains('保险', na=False)
-                    stocks_df.loc[insurance_mask, 'industry'] = '保险'
-                    
-                    # 房地产
-                    real_estate_keywords = ['地产', '房产', '置业']
-                    real_estate_mask = mask_unknown & stocks_df['name'].str.contains('|'.join(real_estate_keywords), na=False)
-                    stocks_df.loc[real_estate_mask, 'industry'] = '房地产'
-                    
-                    # 医药生物
-                    pharma_keywords = ['医药', '生物', '制药']
-                    pharma_mask = mask_unknown & stocks_df['name'].str.contains('|'.join(pharma_keywords), na=False)
-                    stocks_df.loc[pharma_mask, 'industry'] = '医药生物'
-                    
-                    # 通信
-                    comm_keywords = ['通信', '电信', '移动']
-                    comm_mask = mask_unknown & stocks_df['name'].str.contains('|'.join(comm_keywords), na=False)
-                    stocks_df.loc[comm_mask, 'industry'] = '通信'
-                    
-                    # 电子
-                    electronics_keywords = ['电子', '芯片', '半导体']
-                    electronics_mask = mask_unknown & stocks_df['name'].str.contains('|'.join(electronics_keywords), na=False)
-                    stocks_df.loc[electronics_mask, 'industry'] = '电子'
-                    
-                    # 计算机
-                    computer_keywords = ['软件', '网络', '计算机']
-                    computer_mask = mask_unknown & stocks_df['name'].str.contains('|'.join(computer_keywords), na=False)
-                    stocks_df.loc[computer_mask, 'industry'] = '计算机'
+                    # 一次正则扫描完成关键词匹配，再按优先级选出行业
+                    unknown_stocks = stocks_df.loc[mask_unknown]
+                    matches = unknown_stocks['name'].str.extract(_INDUSTRY_NAME_REGEX)
+                    conditions = [matches[f'g{i}'].notna().to_numpy() for i in range(len(INDUSTRY_NAME_PATTERNS))]
+                    # 银行股还要求是上证600/601开头
+                    conditions[0] &= unknown_stocks['symbol_prefix'].isin([600, 601]).to_numpy()
+                    labels = [label for _, label in INDUSTRY_NAME_PATTERNS]
+                    inferred = np.select(conditions[::-1], labels[::-1], default='')
+                    matched = inferred != ''
+                    stocks_df.loc[unknown_stocks.index[matched], 'industry'] = inferred[matched]
                     
                     # 添加行业分类列
-                    stocks_df['industry_category'] = stocks_df['industry'].apply(get_industry_category)
+                    stocks_df['industry_category'] = map_industry_categories(stocks_df['industry'])
                     
                     # 输出行业分类统计，帮助调试
                     logger.info(f"行业分类统计: {stocks_df['industry_category'].value_counts().to_dict()}")
@@ -137,27 +178,55 @@ def load_stock_list():
                     stocks_df['industry'] = '其他'
                     stocks_df['industry_category'] = '其他'
                 
+                # 按代码前缀一次性标注所属板块
+                stocks_df['board'] = stocks_df['symbol'].str[:3].map(PREFIX_TO_BOARD).fillna('其他')
+                
                 # 计算部分股票的技术评分
                 try:
                     # 优先选择主板股票，大市值公司
-                    sample_stocks = stocks_df[stocks_df['symbol'].str.startswith(('000', '600'), na=False)].head(30)
+                    sample_stocks = stocks_df[stocks_df['symbol_prefix'].isin([0, 600])].head(30)
                     logger.info(f"Calculating technical scores for {len(sample_stocks)} stocks")
                     
-                    for idx, row in sample_stocks.iterrows():
-                        try:
-                            data = get_stock_data(row['ts_code'], days=30)
-                            if data is not None and not data.empty:
-                                score = calculate_technical_score(data)
-                                stocks_df.loc[stocks_df['ts_code'] == row['ts_code'], 'technical_score'] = score
-                                logger.info(f"Calculated score for {row['ts_code']}: {score}")
-                        except Exception as e:
-                            logger.error(f"Error calculating score for {row['ts_code']}: {str(e)}")
+                    # 先从磁盘缓存读取当日已算过的得分
+                    trade_date = last_trade_date()
+                    scores = {}
+                    pending = []
+                    for symbol in sample_stocks['symbol']:
+                        cached = SCORE_CACHE.get(f"{symbol}_{trade_date}")
+                        if cached is None:
+                            pending.append(symbol)
+                        else:
+                            scores[symbol] = cached
+                    logger.info(f"Loaded {len(scores)} cached scores, fetching {len(pending)} stocks")
+                    
+                    # 未命中缓存的股票在一个baostock会话中批量获取，只登录一次，返回带code列的长表
+                    if pending:
+                        history = get_stock_data(pending, 30)
+                        
+                        # 所有股票的KMJ指标一次性批量计算，再按股票分组评分
+                        if history is not None and not history.empty:
+                            history = calculate_kmj_indicators_batch(history)
+                            for symbol, data in history.groupby('code', sort=False):
+                                try:
+                                    scores[symbol] = calculate_technical_score(data)
+                                    SCORE_CACHE.set(f"{symbol}_{trade_date}", scores[symbol])
+                                    logger.info(f"Calculated score for {symbol}: {scores[symbol]}")
+                                except Exception as e:
+                                    logger.error(f"Error calculating score for {symbol}: {str(e)}")
+                    
+                    # 一次性写回得分，避免每只股票都对全表做一次布尔索引赋值
+                    stocks_df['technical_score'] = stocks_df['symbol'].map(scores).fillna(stocks_df['technical_score'])
                     
                     logger.info("Finished calculating technical scores")
                 except Exception as e:
                     logger.error(f"Error during technical score calculation: {str(e)}")
                 
-                return stocks_df
+                # 低基数的字符串列转为category，筛选比较按整数编码进行
+                for col in ('industry', 'industry_category', 'board'):
+                    stocks_df[col] = stocks_df[col].astype('category')
+                
+                # 预先按得分降序排好（稳定排序），筛选时直接取前N条
+                return stocks_df.sort_values('technical_score', ascending=False, kind='stable')
             time.sleep(retry_delay)
         except Exception as e:
             logger.error(f"Attempt {attempt + 1}: Failed to load stock list - {str(e)}")
@@ -165,9 +234,55 @@ def load_stock_list():
                 time.sleep(retry_delay)
             else:
                 st.error(f"获取股票列表失败: {str(e)}")
-                return pd.DataFrame(columns=['symbol', 'name', 'industry', 'industry_category', 'ts_code', 'technical_score'])
+                return pd.DataFrame(columns=['symbol', 'name', 'industry', 'industry_category', 'board', 'ts_code', 'technical_score'])
+    
+    return pd.DataFrame(columns=['symbol', 'name', 'industry', 'industry_category', 'board', 'ts_code', 'technical_score'])
+
+# app.py作为Streamlit脚本运行时会以不同模块名重复导入，不使用磁盘缓存，避免同一函数写出冲突的缓存索引
+@njit(error_model='numpy')
+def _score_core(close, volume, kmj2, kmj3, trend, has_kmj, has_trend):
+    """技术评分的数值核心，volume为空数组表示没有成交量数据"""
+    n = close.shape[0]
+    
+    # 基础分数为50分
+    score = 50.0
     
-    return pd.DataFrame(columns=['symbol', 'name', 'industry', 'industry_category', 'ts_code', 'technical_score'])
+    # 趋势得分 (最高30分)
+    if has_trend:
+        if trend == 1:  # 上涨趋势
+            score += 30
+        elif trend == -1:  # 下跌趋势
+            score -= 20
+            
+    # KMJ指标得分 (最高20分)，KMJ2与KMJ3的距离越大表示趋势越强
+    if has_kmj:
+        kmj_diff = abs(kmj2 - kmj3) / kmj3 * 100
+        score += kmj_diff if kmj_diff < 20 else 20.0
+        
+    # 动量得分 (最高20分)
+    if n > 5:
+        # 最近5天的涨幅
+        price_change = (close[n - 1] / close[n - 6] - 1) * 100
+        if price_change > 0:
+            score += price_change if price_change < 20 else 20.0
+        else:
+            score -= abs(price_change) if abs(price_change) < 20 else 20.0
+        
+    # 成交量得分 (最高10分)
+    if n > 5 and volume.shape[0] > 0:
+        # 最近5天的平均成交量，与前5天平均成交量相比
+        avg_vol = np.nanmean(volume[n - 5:])
+        prev_avg_vol = np.nanmean(volume[n - 10:n - 5]) if n > 10 else np.nanmean(volume)
+        
+        if not np.isnan(avg_vol) and not np.isnan(prev_avg_vol) and prev_avg_vol > 0:
+            vol_change = (avg_vol / prev_avg_vol - 1) * 100
+            if vol_change > 0:
+                score += vol_change / 2 if vol_change / 2 < 10 else 10.0
+            else:
+                score -= abs(vol_change) / 2 if abs(vol_change) / 2 < 10 else 10.0
+                
+    # 确保分数在0-100之间
+    return max(0.0, min(100.0, score))
 
 def calculate_technical_score(data):
     """计算技术分析得分"""
@@ -175,76 +290,36 @@ def calculate_technical_score(data):
         if data is None or data.empty:
             return 0.0
             
+        # 不足6天的数据算不出动量和量能，直接给基础分
+        if len(data) < 6:
+            return 50.0
+            
         # 确保KMJ指标已计算
         if 'KMJ1' not in data.columns:
             data = calculate_kmj_indicators(data)
             
-        # 获取最新的数据
-        latest = data.iloc[-1]
-        
-        # 基础分数为50分
-        score = 50.0
+        # 一次性取出numpy数组，数值计算交给_score_core
+        columns = data.columns
+        has_kmj = 'KMJ2' in columns and 'KMJ3' in columns
+        has_trend = 'KMJ_TREND' in columns
+        close = data['close'].to_numpy(dtype=np.float64)
+        volume = data['volume'].to_numpy(dtype=np.float64) if 'volume' in columns else np.empty(0)
+        kmj2 = data['KMJ2'].to_numpy(dtype=np.float64)[-1] if has_kmj else np.nan
+        kmj3 = data['KMJ3'].to_numpy(dtype=np.float64)[-1] if has_kmj else np.nan
+        trend = data['KMJ_TREND'].to_numpy(dtype=np.float64)[-1] if has_trend else np.nan
         
-        # 趋势得分 (最高30分)
-        if 'KMJ_TREND' in latest:
-            if latest['KMJ_TREND'] == 1:  # 上涨趋势
-                score += 30
-            elif latest['KMJ_TREND'] == -1:  # 下跌趋势
-                score -= 20
-                
-        # KMJ指标得分 (最高20分)
-        if 'KMJ2' in latest and 'KMJ3' in latest:
-            # KMJ2与KMJ3的距离，距离越大表示趋势越强
-            kmj_diff = abs(latest['KMJ2'] - latest['KMJ3']) / latest['KMJ3'] * 100
-            kmj_score = min(20, kmj_diff)
-            score += kmj_score
-            
-        # 动量得分 (最高20分)
-        if len(data) > 5:
-            # 最近5天的涨幅
-            price_change = (latest['close'] / data.iloc[-6]['close'] - 1) * 100
-            if price_change > 0:
-                score += min(20, price_change)
-        else:
-                score -= min(20, abs(price_change))
-                
-        # 成交量得分 (最高10分)
-        if 'volume' in data.columns and len(data) > 5:
-            # 最近5天的平均成交量
-            avg_vol = data['volume'].tail(5).mean()
-            # 与前5天平均成交量相比
-            prev_avg_vol = data['volume'].iloc[-10:-5].mean() if len(data) > 10 else data['volume'].mean()
-            
-            if not np.isnan(avg_vol) and not np.isnan(prev_avg_vol) and prev_avg_vol > 0:
-                vol_change = (avg_vol / prev_avg_vol - 1) * 100
-                if vol_change > 0:
-                    score += min(10, vol_change / 2)
-                else:
-                    score -= min(10, abs(vol_change) / 2)
-                    
-        # 确保分数在0-100之间
-        return max(0, min(100, score))
+        return float(_score_core(close, volume, kmj2, kmj3, trend, has_kmj, has_trend))
     except Exception as e:
         logger.error(f"Error calculating technical score: {str(e)}")
         return 0.0
 
 def get_stock_boards(symbol):
     """获取股票所属板块"""
-    if symbol.startswith('600') or symbol.startswith('601') or symbol.startswith('603'):
-        return '上证主板'
-    elif symbol.startswith('000'):
-        return '深证主板'
-    elif symbol.startswith('002'):
-        return '中小板'
-    elif symbol.startswith('300'):
-        return '创业板'
-    elif symbol.startswith('688'):
-        return '科创板'
-    else:
-        return '其他'
+    return PREFIX_TO_BOARD.get(symbol[:3], '其他')
 
+@st.cache_data(ttl=600)
 def screen_stocks(stocks_df, min_score=0, selected_industry_category='全部', selected_board='全部', max_stocks=50):
-    """筛选股票"""
+    """筛选股票，stocks_df需已按技术得分降序排列（load_stock_list的返回值）"""
     # 按技术分数筛选
     filtered_stocks = stocks_df[stocks_df['technical_score'] >= min_score]
     
@@ -253,29 +328,17 @@ def screen_stocks(stocks_df, min_score=0, selected_industry_category='全部', s
         filtered_stocks = filtered_stocks[filtered_stocks['industry_category'] == selected_industry_category]
     
     # 按板块筛选
-    if selected_board != '全部':
-        if selected_board == '主板':
-            # 上交所主板(600, 601, 603)或深交所主板(000)
-            filtered_stocks = filtered_stocks[
-                filtered_stocks['symbol'].str.startswith(('600', '601', '603', '000'))
-            ]
-        elif selected_board == '创业板':
-            # 创业板(300)
-            filtered_stocks = filtered_stocks[filtered_stocks['symbol'].str.startswith('300')]
-        elif selected_board == '科创板':
-            # 科创板(688)
-            filtered_stocks = filtered_stocks[filtered_stocks['symbol'].str.startswith('688')]
-        elif selected_board == '中小板':
-            # 中小板(002)
-            filtered_stocks = filtered_stocks[filtered_stocks['symbol'].str.startswith('002')]
+    if selected_board in BOARD_GROUPS:
+        filtered_stocks = filtered_stocks[filtered_stocks['board'].isin(BOARD_GROUPS[selected_board])]
     
-    # 按技术得分排序并限制数量
-    filtered_stocks = filtered_stocks.nlargest(max_stocks, 'technical_score')
+    # 输入已按技术得分降序排列，过滤不改变顺序，直接截取前N条
+    filtered_stocks = filtered_stocks.head(max_stocks)
     
     return filtered_stocks
 
-def get_stock_data_with_indicators(stock_code, days=60):
-    """获取带有技术指标的股票数据"""
+@st.cache_data(ttl=3600, show_spinner=False)
+def get_stock_data_with_indicators(stock_code, days=60, trade_date=None):
+    """获取带有技术指标的股票数据，trade_date只参与缓存键，当日日线发布后自动失效"""
     data = get_stock_data(stock_code, days=days)
     if data is not None and not data.empty:
         # 计算KMJ指标
@@ -287,6 +350,87 @@ def get_stock_data_with_indicators(stock_code, days=60):
             st.warning("计算KMJ指标时出错，可能会影响分析结果")
     return data
 
+# 图表对象较大，与行情数据同样按小时失效，并限制缓存的图表数量
+@st.cache_data(ttl=3600, max_entries=50, show_spinner=False)
+def build_kline_figure(data, title):
+    """构建带KMJ指标和买卖信号的K线图，数据不变时直接复用缓存的图表"""
+    # 日线数据只需要日期部分，避免每个点都序列化成带时分秒的时间戳
+    if pd.api.types.is_datetime64_any_dtype(data['date']):
+        data = data.assign(date=data['date'].dt.strftime('%Y-%m-%d'))
+    
+    # 创建K线图
+    fig = go.Figure(data=[go.Candlestick(
+        x=data['date'],
+        open=data['open'],
+        high=data['high'],
+        low=data['low'],
+        close=data['close'],
+        name='K线'
+    )])
+    
+    # 添加KMJ指标
+    if 'KMJ2' in data.columns and 'KMJ3' in data.columns:
+        # 过滤掉NaN值；指标线保留3位小数，价格精度只有0.01，图上看不出差别但序列化的JSON小得多
+        valid_data = data.dropna(subset=['KMJ2', 'KMJ3']).round({'KMJ2': 3, 'KMJ3': 3})
+        
+        if not valid_data.empty:
+            fig.add_trace(go.Scatter(
+                x=valid_data['date'],
+                y=valid_data['KMJ2'],
+                name='KMJ2',
+                line=dict(color='purple')
+            ))
+            fig.add_trace(go.Scatter(
+                x=valid_data['date'],
+                y=valid_data['KMJ3'],
+                name='KMJ3',
+                line=dict(color='blue')
+            ))
+        else:
+            st.warning("KMJ指标数据缺失，无法显示趋势线")
+    
+    # 添加买入信号
+    if 'KMJ_BUY_SIGNAL' in data.columns:
+        buy_signals = data[data['KMJ_BUY_SIGNAL'] == True]
+        if not buy_signals.empty:
+            fig.add_trace(go.Scatter(
+                x=buy_signals['date'],
+                y=(buy_signals['low'] * 0.99).round(3),
+                mode='markers',
+                name='买入信号',
+                marker=dict(
+                    symbol='triangle-up',
+                    size=10,
+                    color='red'
+                )
+            ))
+    
+    # 添加卖出信号
+    if 'KMJ_SELL_SIGNAL' in data.columns:
+        sell_signals = data[data['KMJ_SELL_SIGNAL'] == True]
+        if not sell_signals.empty:
+            fig.add_trace(go.Scatter(
+                x=sell_signals['date'],
+                y=(sell_signals['high'] * 1.01).round(3),
+                mode='markers',
+                name='卖出信号',
+                marker=dict(
+                    symbol='triangle-down',
+                    size=10,
+                    color='green'
+                )
+            ))
+    
+    fig.update_layout(
+        title=title,
+        yaxis_title="价格",
+        xaxis_title="日期",
+        template="plotly_dark",
+        height=500
+    )
+    
+    return fig
+
 def main():
     # 初始化session_state
     if 'filtered_stocks' not in st.session_state:
@@ -324,13 +468,13 @@ def main():
                     # 板块选择
                     selected_board = st.selectbox(
                         "选择板块",
-                        ['全部', '主板', '创业板', '科创板', '中小板'],
-                        index=['全部', '主板', '创业板', '科创板', '中小板'].index(st.session_state['selected_board'])
+                        BOARD_OPTIONS,
+                        index=BOARD_OPTIONS.index(st.session_state['selected_board'])
                     )
                     st.session_state['selected_board'] = selected_board
                     
                     # 行业大类选择
-                    industry_categories = ['全部'] + sorted(list(INDUSTRY_CATEGORIES.keys()))
+                    industry_categories = INDUSTRY_CATEGORY_OPTIONS
                     selected_industry_category = st.selectbox(
                         "选择行业大类",
                         industry_categories,
@@ -426,8 +570,8 @@ def main():
                     if not filtered_stocks.empty:
                         st.success(f"找到 {len(filtered_stocks)} 只符合条件的股票")
                         
-                        stock_options = [''] + filtered_stocks.apply(
-                            lambda x: f"{x['symbol']} - {x['name']}", axis=1
+                        stock_options = [''] + (
+                            filtered_stocks['symbol'].astype(str) + ' - ' + filtered_stocks['name'].astype(str)
                         ).tolist()
                         
                         selected_stock = st.selectbox(
@@ -466,11 +610,10 @@ def main():
                                 'technical_score': '技术评分'
                             })
                             
-                            # 应用格式化并显示
+                            # 交给前端按列格式化显示，不在pandas里逐格生成字符串
                             st.dataframe(
-                                ranking_df.style.format({
-                                    '技术评分': '{:.2f}'
-                                }),
+                                ranking_df,
+                                column_config={'技术评分': st.column_config.NumberColumn(format='%.2f')},
                                 use_container_width=True,
                                 height=400
                             )
@@ -494,20 +637,10 @@ def main():
                         
                         # 获取股票数据
                         with st.spinner('正在获取历史数据...'):
-                            data = get_stock_data_with_indicators(stock_code, days=60)
+                            data = get_stock_data_with_indicators(stock_code, days=60, trade_date=last_trade_date())
                             
                             if data is not None and not data.empty:
-                                # 计算KMJ指标
-                                try:
-                                    data = calculate_kmj_indicators(data)
-                                    
-                                    # 添加信号
-                                    data = get_kmj_signals(data)
-                                except Exception as e:
-                                    logger.error(f"Error calculating KMJ indicators: {str(e)}")
-                                    st.warning("计算KMJ指标时出错，可能会影响分析结果")
-                                
-                                # 计算单支股票的技术得分
+                                # 计算单支股票的技术得分（KMJ指标已在get_stock_data_with_indicators中计算）
                                 technical_score = calculate_technical_score(data)
                                 
                                 # 更新股票列表中的技术评分
@@ -521,7 +654,7 @@ def main():
                                     st.metric("技术分析得分", f"{technical_score:.2f}分")
                                 
                                 with info_cols[1]:
-                                    board = get_stock_boards(stock_code)
+                                    board = stock_info['board'] if 'board' in stock_info else get_stock_boards(stock_code)
                                     st.metric("所属板块", board)
                                     
                                 with info_cols[2]:
@@ -532,81 +665,17 @@ def main():
                                     industry = stock_info['industry'] if 'industry' in stock_info else '未知'
                                     st.metric("细分行业", industry)
                                 
+                                # 最新一行和收盘价/成交量数组只取一次，下面的展示都基于它们
+                                latest = data.iloc[-1]
+                                closes = data['close'].to_numpy(dtype=float)
+                                volumes = data['volume'].to_numpy(dtype=float) if 'volume' in data.columns else None
+                                n_days = len(closes)
+                                
                                 # 显示分析结果
                                 st_col1, st_col2 = st.columns([3, 1])
                                 
                                 with st_col1:
-                                    # 创建K线图
-                                    fig = go.Figure(data=[go.Candlestick(
-                                        x=data['date'],
-                                        open=data['open'],
-                                        high=data['high'],
-                                        low=data['low'],
-                                        close=data['close'],
-                                        name='K线'
-                                    )])
-                                    
-                                    # 添加KMJ指标
-                                    if 'KMJ2' in data.columns and 'KMJ3' in data.columns:
-                                        # 过滤掉NaN值
-                                        valid_data = data.dropna(subset=['KMJ2', 'KMJ3'])
-                                        
-                                        if not valid_data.empty:
-                                            fig.add_trace(go.Scatter(
-                                                x=valid_data['date'],
-                                                y=valid_data['KMJ2'],
-                                                name='KMJ2',
-                                                line=dict(color='purple')
-                                            ))
-                                            fig.add_trace(go.Scatter(
-                                                x=valid_data['date'],
-                                                y=valid_data['KMJ3'],
-                                                name='KMJ3',
-                                                line=dict(color='blue')
-                                            ))
-                                        else:
-                                            st.warning("KMJ指标数据缺失，无法显示趋势线")
-                                    
-                                    # 添加买入信号
-                                    if 'KMJ_BUY_SIGNAL' in data.columns:
-                                        buy_signals = data[data['KMJ_BUY_SIGNAL'] == True]
-                                        if not buy_signals.empty:
-                                            fig.add_trace(go.Scatter(
-                                                x=buy_signals['date'],
-                                                y=buy_signals['low'] * 0.99,
-                                                mode='markers',
-                                                name='买入信号',
-                                                marker=dict(
-                                                    symbol='triangle-up',
-                                                    size=10,
-                                                    color='red'
-                                                )
-                                            ))
-                                    
-                                    # 添加卖出信号
-                                    if 'KMJ_SELL_SIGNAL' in data.columns:
-                                        sell_signals = data[data['KMJ_SELL_SIGNAL'] == True]
-                                        if not sell_signals.empty:
-                                            fig.add_trace(go.Scatter(
-                                                x=sell_signals['date'],
-                                                y=sell_signals['high'] * 1.01,
-                                                mode='markers',
-                                                name='卖出信号',
-                                                marker=dict(
-                                                    symbol='triangle-down',
-                                                    size=10,
-                                                    color='green'
-                                                )
-                                            ))
-                                    
-                                    fig.update_layout(
-                                        title=f"{selected_stock} K线图",
-                                        yaxis_title="价格",
-                                        xaxis_title="日期",
-                                        template="plotly_dark",
-                                        height=500
-                                    )
-                                    
+                                    fig = build_kline_figure(data, f"{selected_stock} K线图")
                                     st.plotly_chart(fig, use_container_width=True)
                                 
                                 with st_col2:
@@ -614,7 +683,7 @@ def main():
                                     st.subheader("技术指标")
                                     
                                     if 'KMJ_TREND' in data.columns:
-                                        latest_trend = data.iloc[-1]['KMJ_TREND']
+                                        latest_trend = latest['KMJ_TREND']
                                         if pd.notna(latest_trend):
                                             trend_text = "上涨" if latest_trend == 1 else "下跌" if latest_trend == -1 else "横盘"
                                             trend_delta = "↗" if latest_trend == 1 else "↘" if latest_trend == -1 else "→"
@@ -625,11 +694,11 @@ def main():
                                     
                                     # 显示最新信号
                                     signals = []
-                                    if 'KMJ_BUY_SIGNAL' in data.columns and data.iloc[-1]['KMJ_BUY_SIGNAL'] == True:
+                                    if 'KMJ_BUY_SIGNAL' in data.columns and latest['KMJ_BUY_SIGNAL'] == True:
                                         signals.append("买入")
-                                    if 'KMJ_SELL_SIGNAL' in data.columns and data.iloc[-1]['KMJ_SELL_SIGNAL'] == True:
+                                    if 'KMJ_SELL_SIGNAL' in data.columns and latest['KMJ_SELL_SIGNAL'] == True:
                                         signals.append("卖出")
-                                    if 'LIMIT_UP' in data.columns and data.iloc[-1]['LIMIT_UP'] == True:
+                                    if 'LIMIT_UP' in data.columns and latest['LIMIT_UP'] == True:
                                         signals.append("涨停")
                                     
                                     if signals:
@@ -638,20 +707,17 @@ def main():
                                         st.metric("最新信号", "无")
                                     
                                     # 显示数据摘要
-                                    latest = data.iloc[-1]
-                                    prev5 = data.iloc[-6] if len(data) > 5 else None
-                                    
-                                    if prev5 is not None:
-                                        price_change_5d = (latest['close'] / prev5['close'] - 1) * 100
+                                    if n_days > 5:
+                                        price_change_5d = (closes[-1] / closes[-6] - 1) * 100
                                         delta_color = "normal" if price_change_5d >= 0 else "inverse"
                                         st.metric("5日涨跌幅", f"{price_change_5d:.2f}%", 
                                                  delta=f"{price_change_5d:.2f}%",
                                                  delta_color=delta_color)
                                     
                                     # 显示价格/成交量
-                                    st.metric("最新价", f"{latest['close']:.2f}")
-                                    if 'volume' in latest and pd.notna(latest['volume']) and latest['volume'] > 0:
-                                        st.metric("成交量", format_volume(latest['volume']))
+                                    st.metric("最新价", f"{closes[-1]:.2f}")
+                                    if volumes is not None and pd.notna(volumes[-1]) and volumes[-1] > 0:
+                                        st.metric("成交量", format_volume(volumes[-1]))
                                     else:
                                         st.metric("成交量", "无数据")
                                 
@@ -663,7 +729,6 @@ def main():
                                 
                                 # KMJ分析
                                 if 'KMJ2' in data.columns and 'KMJ3' in data.columns:
-                                    latest = data.iloc[-1]
                                     if pd.notna(latest['KMJ2']) and pd.notna(latest['KMJ3']) and latest['KMJ3'] != 0:
                                         if latest['KMJ2'] > latest['KMJ3']:
                                             diff_pct = (latest['KMJ2'] / latest['KMJ3'] - 1) * 100
@@ -675,18 +740,19 @@ def main():
                                         analysis_text.append("KMJ指标数据不足，无法分析趋势")
                                 
                                 # 价格分析
-                                if len(data) > 5:
-                                    price_change_5d = (latest['close'] / data.iloc[-6]['close'] - 1) * 100
+                                if n_days > 5:
+                                    price_change_5d = (closes[-1] / closes[-6] - 1) * 100
                                     analysis_text.append(f"近5日涨跌幅: {price_change_5d:.2f}%")
                                 
-                                if len(data) > 20:
-                                    price_change_20d = (latest['close'] / data.iloc[-21]['close'] - 1) * 100
+                                if n_days > 20:
+                                    price_change_20d = (closes[-1] / closes[-21] - 1) * 100
                                     analysis_text.append(f"近20日涨跌幅: {price_change_20d:.2f}%")
                                 
                                 # 成交量分析
-                                if 'volume' in data.columns and len(data) > 5:
-                                    vol_5d = data['volume'].tail(5).mean()
-                                    vol_prev_5d = data['volume'].iloc[-10:-5].mean() if len(data) > 10 else data['volume'].mean()
+                                if volumes is not None and n_days > 5:
+                                    # nanmean与pandas的mean一样忽略缺失值
+                                    vol_5d = np.nanmean(volumes[-5:])
+                                    vol_prev_5d = np.nanmean(volumes[-10:-5]) if n_days > 10 else np.nanmean(volumes)
                                     
                                     if pd.notna(vol_5d) and pd.notna(vol_prev_5d) and vol_prev_5d > 0:
                                         if vol_5d > vol_prev_5d:
@@ -706,30 +772,17 @@ def main():
                                 
                                 # 显示数据表格
                                 with st.expander("查看历史数据"):
-                                    display_data = data.copy()
                                     # 只显示重要列
                                     columns_to_show = ['date', 'open', 'high', 'low', 'close', 'volume']
                                     
                                     # 添加KMJ指标列
-                                    if 'KMJ1' in display_data.columns:
-                                        columns_to_show.append('KMJ1')
-                                    if 'KMJ2' in display_data.columns:
-                                        columns_to_show.append('KMJ2')
-                                    if 'KMJ3' in display_data.columns:
-                                        columns_to_show.append('KMJ3')
+                                    columns_to_show += [col for col in ('KMJ1', 'KMJ2', 'KMJ3') if col in data.columns]
                                         
-                                    # 显示数据
+                                    # 显示数据，数值格式由前端渲染，成交量整列换算成手/万手/亿手
+                                    history = data[columns_to_show].assign(volume=format_volume_vec(data['volume']))
                                     st.dataframe(
-                                        display_data[columns_to_show].style.format({
-                                            'open': '{:.2f}',
-                                            'high': '{:.2f}',
-                                            'low': '{:.2f}',
-                                            'close': '{:.2f}',
-                                            'volume': '{:,.0f}',
-                                            'KMJ1': '{:.2f}',
-                                            'KMJ2': '{:.2f}',
-                                            'KMJ3': '{:.2f}'
-                                        })
+                                        history,
+                                        column_config=HISTORY_COLUMN_CONFIG
                                     )
                             else:
                                 st.error(f"无法获取 {selected_stock} 的数据，请尝试其他股票")
@@ -753,5 +806,15 @@ def format_volume(volume):
     else:
         return f"{volume/100000000:.2f}亿手"
 
+def format_volume_vec(volumes):
+    """format_volume的向量化版本，一次处理整列成交量，返回字符串数组"""
+    vols = np.asarray(volumes, dtype=np.float64)
+    small = vols < 10000
+    medium = vols < 100000000
+    scaled = np.select([small, medium], [vols, vols / 10000], vols / 100000000)
+    suffix = np.select([small, medium], ['手', '万手'], '亿手')
+    formatted = np.char.add(np.char.mod('%.2f', scaled), suffix)
+    return np.where(np.isnan(vols) | (vols == 0), '无数据', formatted)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
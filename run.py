@@ -8,7 +8,7 @@
 
 import os
 import sys
-import subprocess
+import hashlib
 import logging
 import unittest
 
@@ -16,6 +16,9 @@ import unittest
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 记录上次测试全部通过时源码和测试文件的指纹，文件未改动时跳过测试直接启动
+LAST_PASS_FILE = '.run_last_pass'
+
 def main():
     """主函数：运行测试并启动应用"""
     # 设置工作目录为脚本所在目录
@@ -31,29 +34,57 @@ def main():
     
     # 运行测试
     print("\n[1/2] 运行自动化测试...")
-    success = run_tests()
-    
-    if not success:
-        print("\n❌ 测试失败，请修复上述问题后再运行应用。")
-        sys.exit(1)
-    
-    # 如果测试通过，启动应用
-    print("\n✅ 所有测试通过!")
+    fingerprint = source_fingerprint()
+    if read_last_pass() == fingerprint:
+        print("\n✅ 源码和测试自上次通过后未改动，跳过测试")
+    else:
+        success = run_tests()
+        
+        if not success:
+            print("\n❌ 测试失败，请修复上述问题后再运行应用。")
+            sys.exit(1)
+        
+        # 如果测试通过，记录指纹后启动应用
+        write_last_pass(fingerprint)
+        print("\n✅ 所有测试通过!")
     print("\n[2/2] 启动应用程序...")
     
+    # 用streamlit进程直接替换当前进程，不再保留一个等待子进程的Python解释器
+    sys.stdout.flush()
+    sys.stderr.flush()
     try:
-        # 使用subprocess调用streamlit run app.py
-        subprocess.run(["streamlit", "run", "app.py"], check=True)
-    except subprocess.CalledProcessError as e:
+        os.execvp("streamlit", ["streamlit", "run", "app.py"])
+    except OSError as e:
         logger.error(f"启动应用程序失败: {e}")
         print(f"\n❌ 启动应用程序失败: {e}")
         sys.exit(1)
-    except KeyboardInterrupt:
-        print("\n⚠️ 应用程序被用户中断")
-    except Exception as e:
-        logger.error(f"发生未知错误: {e}")
-        print(f"\n❌ 发生未知错误: {e}")
-        sys.exit(1)
+
+def source_fingerprint():
+    """src和tests下所有.py文件路径与修改时间的摘要，任一文件增删改都会改变指纹"""
+    entries = []
+    for folder in ('src', 'tests'):
+        for dirpath, _, filenames in os.walk(folder):
+            for name in filenames:
+                if name.endswith('.py'):
+                    path = os.path.join(dirpath, name)
+                    entries.append(f"{path}:{os.path.getmtime(path)}")
+    return hashlib.sha1('\n'.join(sorted(entries)).encode('utf-8')).hexdigest()
+
+def read_last_pass():
+    """读取上次测试通过时的指纹，不存在时返回None"""
+    try:
+        with open(LAST_PASS_FILE, 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def write_last_pass(fingerprint):
+    """记录本次测试通过时的指纹"""
+    try:
+        with open(LAST_PASS_FILE, 'w', encoding='utf-8') as f:
+            f.write(fingerprint)
+    except OSError as e:
+        logger.warning(f"记录测试结果失败: {e}")
 
 def run_tests():
     """运行测试并返回是否成功"""
@@ -1,6 +1,90 @@
 import pandas as pd
 import numpy as np
 from typing import Dict, List, Optional
+from functools import lru_cache
+from src.core._njit import njit
+
+# 本模块既以src.analysis.stock_analyzer导入，也被src/data以stock_analyzer直接导入，
+# numba的磁盘缓存按源文件存储且记录定义模块名，两种导入方式会互相读到对方的缓存而失败，
+# 所以这里的编译函数都不使用cache=True，每个进程首次调用时编译
+
+# KMJ2的窗口长度：21日线性递减加权，窗口内最早的一天权重为21，最近一天为1
+KMJ2_PERIOD = 21
+
+@njit
+def _kmj_kernel(open_, high, low, close, period):
+    """一次遍历算出KMJ1/KMJ2/KMJ3
+
+    KMJ2为KMJ1的线性加权移动平均（权重period, ..., 1），前period-1个位置为NaN。
+    记窗口和S=Σk、加权和W=Σ(period-j)·k，窗口右移一天时
+        W' = W + S - (period+1)·k_out + k_in,  S' = S - k_out + k_in
+    每步只需常数次加减；窗口内出现NaN时输出NaN，恢复后重新求和。
+    KMJ3为KMJ2的5日均值，用带Kahan补偿的累加和每步O(1)更新，与pandas rolling.mean
+    一样避免累积误差。窗口未满或含NaN时结果为NaN。
+    """
+    n = close.shape[0]
+    weight_sum = period * (period + 1) / 2
+    kmj1 = np.empty(n)
+    kmj2 = np.full(n, np.nan)
+    kmj3 = np.full(n, np.nan)
+    # KMJ2的递推状态
+    window_sum = 0.0
+    weighted_sum = 0.0
+    window_nan = 0
+    stale = True
+    # KMJ3的累加状态
+    total = 0.0
+    compensation = 0.0
+    nan_count = 0
+    for i in range(n):
+        k = (low[i] + high[i] + open_[i] + 3 * close[i]) / 6
+        kmj1[i] = k
+        
+        # KMJ2：k进入、period天前的值移出窗口
+        if np.isnan(k):
+            window_nan += 1
+        if i >= period and np.isnan(kmj1[i - period]):
+            window_nan -= 1
+        if i >= period - 1:
+            if window_nan > 0:
+                stale = True
+            elif stale:
+                # 第一个完整窗口或NaN移出后，直接求一次和
+                window_sum = 0.0
+                weighted_sum = 0.0
+                for j in range(period):
+                    x = kmj1[i - period + 1 + j]
+                    window_sum += x
+                    weighted_sum += (period - j) * x
+                stale = False
+                kmj2[i] = weighted_sum / weight_sum
+            else:
+                k_out = kmj1[i - period]
+                weighted_sum += window_sum - (period + 1) * k_out + k
+                window_sum += k - k_out
+                kmj2[i] = weighted_sum / weight_sum
+        
+        # KMJ3：新值进入、5天前的值移出窗口
+        x = kmj2[i]
+        if np.isnan(x):
+            nan_count += 1
+        else:
+            y = x - compensation
+            t = total + y
+            compensation = (t - total) - y
+            total = t
+        if i >= 5:
+            old = kmj2[i - 5]
+            if np.isnan(old):
+                nan_count -= 1
+            else:
+                y = -old - compensation
+                t = total + y
+                compensation = (t - total) - y
+                total = t
+        if i >= 4 and nan_count == 0:
+            kmj3[i] = total / 5
+    return kmj1, kmj2, kmj3
 
 def calculate_kmj_indicators(df: pd.DataFrame) -> pd.DataFrame:
     """计算KMJ指标"""
@@ -8,23 +92,23 @@ def calculate_kmj_indicators(df: pd.DataFrame) -> pd.DataFrame:
         return df
         
     # KMJ1 = (LOW + HIGH + OPEN + 3*CLOSE) / 6
-    df['KMJ1'] = (df['low'] + df['high'] + df['open'] + 3 * df['close']) / 6
-    
-    # KMJ2 = 加权移动平均 (21天)
-    weights = np.array(range(21, 0, -1))  # 21, 20, ..., 1
-    weights = weights / weights.sum()
-    
-    # 使用rolling window计算加权平均
-    df['KMJ2'] = df['KMJ1'].rolling(window=21).apply(
-        lambda x: np.sum(weights[-len(x):] * x) if len(x) > 0 else np.nan
-    )
-    
+    # KMJ2 = 加权移动平均 (21天)，窗口内最早的一天权重为21，与原rolling.apply一致，逐日递推更新
     # KMJ3 = 5日均线
-    df['KMJ3'] = df['KMJ2'].rolling(window=5).mean()
+    # 三个指标在一个编译好的循环里一次算完，不产生中间Series
+    kmj1, kmj2, kmj3 = _kmj_kernel(
+        *(df[col].to_numpy(dtype=np.float64) for col in ('open', 'high', 'low', 'close')),
+        KMJ2_PERIOD
+    )
+    df['KMJ1'] = kmj1
+    df['KMJ2'] = kmj2
+    df['KMJ3'] = kmj3
     
-    # 填充NaN值
-    df['KMJ2'] = df['KMJ2'].fillna(method='ffill')
-    df['KMJ3'] = df['KMJ3'].fillna(method='ffill')
+    # 填充NaN值：开头的NaN没有可填充的值，只有中间出现NaN（原始数据缺失）时才需要前向填充
+    # KMJ2前period-1个、KMJ3前period+3个位置是窗口未满的预热期
+    if np.isnan(kmj2[KMJ2_PERIOD - 1:]).any():
+        df['KMJ2'] = df['KMJ2'].ffill()
+    if np.isnan(kmj3[KMJ2_PERIOD + 3:]).any():
+        df['KMJ3'] = df['KMJ3'].ffill()
     
     return df
 
@@ -33,63 +117,159 @@ def calculate_signals(df: pd.DataFrame) -> pd.DataFrame:
     if len(df) < 25:
         return df
         
+    # 各列只取一次NumPy数组，前一天的值用错位数组表示，首日为NaN，比较结果为False
+    kmj2 = df['KMJ2'].to_numpy(dtype=np.float64)
+    kmj3 = df['KMJ3'].to_numpy(dtype=np.float64)
+    close = df['close'].to_numpy(dtype=np.float64)
+    prev_kmj2 = np.concatenate(([np.nan], kmj2[:-1]))
+    prev_kmj3 = np.concatenate(([np.nan], kmj3[:-1]))
+    prev_close = np.concatenate(([np.nan], close[:-1]))
+    
     # 趋势信号
-    df['trend'] = np.where(df['KMJ2'] > df['KMJ3'], 1, -1)
+    df['trend'] = np.where(kmj2 > kmj3, np.int8(1), np.int8(-1))
     
     # 买入信号：KMJ2上穿KMJ3
-    df['buy_signal'] = (df['KMJ2'] > df['KMJ3']) & (df['KMJ2'].shift(1) <= df['KMJ3'].shift(1))
+    df['buy_signal'] = (kmj2 > kmj3) & (prev_kmj2 <= prev_kmj3)
     
     # 卖出信号：KMJ2下穿KMJ3
-    df['sell_signal'] = (df['KMJ2'] < df['KMJ3']) & (df['KMJ2'].shift(1) >= df['KMJ3'].shift(1))
+    df['sell_signal'] = (kmj2 < kmj3) & (prev_kmj2 >= prev_kmj3)
     
     # 涨停信号
-    df['limit_up'] = df['close'] > df['close'].shift(1) * 1.0985
+    df['limit_up'] = close > prev_close * 1.0985
     
     return df
 
+def _to_arrays(df: pd.DataFrame, columns) -> Dict[str, np.ndarray]:
+    """把用到的列一次性转换为NumPy数组（列式存储），之后的计算不再经过DataFrame"""
+    return {col: df[col].to_numpy() for col in columns}
+
+@njit(error_model='numpy')
+def _score_kernel(kmj2, kmj3, close, volume):
+    """技术得分核心计算，只接收float64数组，返回未取整的总分"""
+    # 1. 趋势得分 (0-4分)
+    trend_score = 0.0
+    if kmj2[-1] > kmj3[-1]:  # 当前趋势向上
+        trend_score += 2
+        if np.nanmean(kmj2[-5:]) > np.nanmean(kmj3[-5:]):  # 近5日趋势向上
+            trend_score += 1
+        if np.nanmean(kmj2[-10:]) > np.nanmean(kmj3[-10:]):  # 近10日趋势向上
+            trend_score += 1
+            
+    # 2. 动量得分 (0-2分)，每5%得1分，最高2分；NaN按0分
+    momentum = (close[-1] / close[-5] - 1) * 100 / 5
+    momentum_score = momentum if momentum > 0 else 0.0
+    momentum_score = momentum_score if momentum_score < 2 else 2.0
+    
+    # 3. 成交量得分 (0-2分)
+    volume_score = 0.0
+    recent_vol_avg = np.nanmean(volume[-5:])
+    prev_vol_avg = np.nanmean(volume[-10:-5])
+    if recent_vol_avg > prev_vol_avg:
+        volume_score += 1
+    if volume[-1] > recent_vol_avg:
+        volume_score += 1
+        
+    # 4. 波动率得分 (0-2分)
+    # 与pct_change一致：缺失的收盘价先用前值填充，再算日收益率的样本标准差
+    n = len(close)
+    filled = np.empty(n)
+    last = 0
+    for i in range(n):
+        if not np.isnan(close[i]):
+            last = i
+        filled[i] = close[last]
+    returns = filled[1:] / filled[:-1] - 1
+    count = 0
+    total = 0.0
+    for r in returns:
+        if not np.isnan(r):
+            count += 1
+            total += r
+    volatility = np.nan
+    if count > 1:
+        mean = total / count
+        sq = 0.0
+        for r in returns:
+            if not np.isnan(r):
+                sq += (r - mean) ** 2
+        volatility = np.sqrt(sq / (count - 1)) * np.sqrt(252)
+    volatility_score = 2 - volatility if 2 - volatility > 0 else 0.0  # 波动率越小分数越高
+    volatility_score = volatility_score if volatility_score < 2 else 2.0
+    
+    return trend_score + momentum_score + volume_score + volatility_score
+
+def _score_arrays(arrays: Dict[str, np.ndarray]) -> float:
+    """按列数组计算技术得分（0-10分），需要KMJ2、KMJ3、close、volume四列"""
+    total_score = _score_kernel(
+        np.ascontiguousarray(arrays['KMJ2'], dtype=np.float64),
+        np.ascontiguousarray(arrays['KMJ3'], dtype=np.float64),
+        np.ascontiguousarray(arrays['close'], dtype=np.float64),
+        np.ascontiguousarray(arrays['volume'], dtype=np.float64),
+    )
+    return round(float(total_score), 2)
+
 def calculate_technical_score(df: pd.DataFrame) -> float:
     """计算技术分析得分（0-10分）"""
     try:
         if len(df) < 25:
             return 0
-            
-        # 计算指标
-        df = calculate_kmj_indicators(df)
-        df = calculate_signals(df)
-        
-        # 1. 趋势得分 (0-4分)
-        trend_score = 0
-        if df['KMJ2'].iloc[-1] > df['KMJ3'].iloc[-1]:  # 当前趋势向上
-            trend_score += 2
-            if df['KMJ2'].iloc[-5:].mean() > df['KMJ3'].iloc[-5:].mean():  # 近5日趋势向上
-                trend_score += 1
-            if df['KMJ2'].iloc[-10:].mean() > df['KMJ3'].iloc[-10:].mean():  # 近10日趋势向上
-                trend_score += 1
-                
-        # 2. 动量得分 (0-2分)
-        momentum = (df['close'].iloc[-1] / df['close'].iloc[-5] - 1) * 100
-        momentum_score = min(2, max(0, momentum / 5))  # 每5%得1分，最高2分
-        
-        # 3. 成交量得分 (0-2分)
-        volume_score = 0
-        recent_vol_avg = df['volume'].iloc[-5:].mean()
-        prev_vol_avg = df['volume'].iloc[-10:-5].mean()
-        if recent_vol_avg > prev_vol_avg:
-            volume_score += 1
-        if df['volume'].iloc[-1] > recent_vol_avg:
-            volume_score += 1
-            
-        # 4. 波动率得分 (0-2分)
-        volatility = df['close'].pct_change().std() * np.sqrt(252)
-        volatility_score = min(2, max(0, 2 - volatility))  # 波动率越小分数越高
         
-        total_score = trend_score + momentum_score + volume_score + volatility_score
-        return round(total_score, 2)
+        # 得分只取决于OHLCV数据，按原始字节查缓存，同一天重复扫描时直接返回
+        ohlcv = np.vstack([df[col].to_numpy(dtype=np.float64) for col in ('open', 'high', 'low', 'close', 'volume')])
+        return _score_from_bytes(ohlcv.tobytes())
         
     except Exception as e:
         print(f"Error calculating technical score: {str(e)}")
         return 0
 
+@njit
+def _ffill_kernel(values):
+    """前向填充NaN，开头的NaN保持不变"""
+    out = values.copy()
+    for i in range(1, out.shape[0]):
+        if np.isnan(out[i]):
+            out[i] = out[i - 1]
+    return out
+
+@njit(error_model='numpy')
+def _batch_score_kernel(open_, high, low, close, volume, starts, ends, period):
+    """逐只股票计算未取整的技术得分，各股票的行为[starts[g], ends[g])的连续区间"""
+    scores = np.zeros(starts.shape[0])
+    for g in range(starts.shape[0]):
+        s = starts[g]
+        e = ends[g]
+        if e - s < 25:
+            continue
+        _, kmj2, kmj3 = _kmj_kernel(open_[s:e], high[s:e], low[s:e], close[s:e], period)
+        scores[g] = _score_kernel(_ffill_kernel(kmj2), _ffill_kernel(kmj3), close[s:e], volume[s:e])
+    return scores
+
+@lru_cache(maxsize=4096)
+def _score_from_bytes(ohlcv_bytes):
+    """按OHLCV原始字节缓存单只股票的技术得分"""
+    open_, high, low, close, volume = np.frombuffer(ohlcv_bytes, dtype=np.float64).reshape(5, -1)
+    bounds = np.array([0, close.shape[0]])
+    score = _batch_score_kernel(open_, high, low, close, volume, bounds[:1], bounds[1:], KMJ2_PERIOD)[0]
+    return round(float(score), 2)
+
+def calculate_technical_scores(df: pd.DataFrame, code_col: str = 'code') -> pd.Series:
+    """批量计算多只股票的技术得分
+
+    df为长表，每只股票的行按日期排列，用code_col区分股票；返回以股票代码为索引的得分，
+    与逐只调用calculate_technical_score一致，但不再为每只股票构造DataFrame
+    """
+    codes, uniques = pd.factorize(df[code_col], sort=False)
+    # 稳定排序让同一股票的行连续，且保持各自原有的日期顺序
+    order = np.argsort(codes, kind='stable')
+    counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    ends = np.cumsum(counts)
+    starts = ends - counts
+    
+    columns = [df[col].to_numpy(dtype=np.float64)[order] for col in ('open', 'high', 'low', 'close', 'volume')]
+    scores = _batch_score_kernel(*columns, starts, ends, KMJ2_PERIOD)
+    
+    return pd.Series([round(float(score), 2) for score in scores], index=uniques, name='technical_score')
+
 def analyze_stock(df: pd.DataFrame, industry: str) -> Dict:
     """分析股票并返回结果"""
     try:
@@ -105,19 +285,26 @@ def analyze_stock(df: pd.DataFrame, industry: str) -> Dict:
         df = calculate_kmj_indicators(df)
         df = calculate_signals(df)
         
+        # 指标算好后只转换一次数组，评分和最新状态都从数组读取，不再重复计算指标
+        arrays = _to_arrays(df, ('KMJ2', 'KMJ3', 'close', 'volume', 'trend', 'buy_signal', 'sell_signal', 'limit_up'))
+        
         # 计算技术得分
-        score = calculate_technical_score(df)
+        try:
+            score = _score_arrays(arrays)
+        except Exception as e:
+            print(f"Error calculating technical score: {str(e)}")
+            score = 0
         
         # 获取当前趋势
-        current_trend = "上涨" if df['trend'].iloc[-1] > 0 else "下跌"
+        current_trend = "上涨" if arrays['trend'][-1] > 0 else "下跌"
         
         # 获取最新信号
         signals = []
-        if df['buy_signal'].iloc[-1]:
+        if arrays['buy_signal'][-1]:
             signals.append("买入")
-        if df['sell_signal'].iloc[-1]:
+        if arrays['sell_signal'][-1]:
             signals.append("卖出")
-        if df['limit_up'].iloc[-1]:
+        if arrays['limit_up'][-1]:
             signals.append("涨停")
             
         # 生成分析文本
@@ -126,8 +313,8 @@ def analyze_stock(df: pd.DataFrame, industry: str) -> Dict:
 2. 趋势：目前处于{current_trend}趋势
 3. 技术得分：{score}分
 4. KMJ指标：
-   - KMJ2（{df['KMJ2'].iloc[-1]:.2f}）
-   - KMJ3（{df['KMJ3'].iloc[-1]:.2f}）
+   - KMJ2（{arrays['KMJ2'][-1]:.2f}）
+   - KMJ3（{arrays['KMJ3'][-1]:.2f}）
 5. 最新信号：{'、'.join(signals) if signals else '无'}
 """
         
@@ -170,25 +357,35 @@ def get_industry_stocks(df: pd.DataFrame, industry: str) -> pd.DataFrame:
         return pd.DataFrame()
 
 def get_industry_rank(df: pd.DataFrame, industry: str, min_score: float = 0) -> pd.DataFrame:
-    """获取行业排名"""
+    """获取行业排名：行业和分数合成一个布尔掩码筛选一次，再排序一次"""
     try:
-        # 获取行业股票
-        stocks = get_industry_stocks(df, industry)
-        if stocks.empty:
-            return pd.DataFrame()
-            
-        # 确保technical_score列存在
-        if 'technical_score' not in stocks.columns:
-            stocks['technical_score'] = 0.0
+        # 缺少technical_score列时按0分处理
+        if 'technical_score' in df.columns:
+            mask = df['technical_score'] >= min_score
+        else:
+            mask = pd.Series(0.0 >= min_score, index=df.index)
             
-        # 筛选达到最小分数的股票
-        ranked_stocks = stocks[stocks['technical_score'] >= min_score]
+        # 空值和空字符串的行业视为'其他'
+        if industry != '全部':
+            industries = df['industry'] if 'industry' in df.columns else pd.Series('其他', index=df.index)
+            if industry == '其他':
+                mask &= industries.isna() | industries.isin(['', '其他'])
+            else:
+                mask &= industries == industry
+                
+        ranked_stocks = df.loc[mask]
         if ranked_stocks.empty:
             return pd.DataFrame()
             
+        # 补齐筛选时视为默认值的列
+        if industry == '其他':
+            ranked_stocks = ranked_stocks.assign(industry='其他')
+        if 'technical_score' not in ranked_stocks.columns:
+            ranked_stocks = ranked_stocks.assign(technical_score=0.0)
+            
         # 按技术得分排序
-        return ranked_stocks.sort_values('technical_score', ascending=False)
+        return ranked_stocks.sort_values('technical_score', ascending=False, kind='stable')
         
     except Exception as e:
         print(f"Error getting industry rank: {str(e)}")
-        return pd.DataFrame() 
\ No newline at end of file
+        return pd.DataFrame()
@@ -0,0 +1,10 @@
+"""numba为可选依赖：未安装时njit退化为原样返回函数的装饰器"""
+
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        # 兼容 @njit 和 @njit(cache=True) 两种写法
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
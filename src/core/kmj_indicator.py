@@ -1,5 +1,56 @@
 import pandas as pd
 import numpy as np
+from functools import lru_cache
+from ._njit import njit
+
+# KMJ2的20日权重：越近的数据权重越大，已归一化
+KMJ2_WEIGHTS = np.array([1/(i+1) for i in range(20)])[::-1]
+KMJ2_WEIGHTS = KMJ2_WEIGHTS / KMJ2_WEIGHTS.sum()
+KMJ2_WEIGHTS.flags.writeable = False
+KMJ2_PERIOD = len(KMJ2_WEIGHTS)
+
+@njit(cache=True)
+def _kmj_kernel(low, high, open_, close):
+    """一次遍历算出KMJ1/KMJ2/KMJ3，窗口内有NaN时结果为NaN，与pandas版本一致
+
+    窗口长度和权重直接引用模块级常量，numba编译时把它们当作常量，
+    内层循环次数固定，可以完全展开并向量化
+    """
+    n = close.shape[0]
+    period = KMJ2_PERIOD
+    weights = KMJ2_WEIGHTS
+    kmj1 = (low + high + open_ + 3 * close) / 6
+    kmj2 = np.full(n, np.nan)
+    kmj3 = np.full(n, np.nan)
+    for i in range(period, n):
+        # KMJ2取前period天（不含当天）的加权和
+        total = 0.0
+        for j in range(period):
+            total += kmj1[i - period + j] * weights[j]
+        kmj2[i] = total
+        # KMJ3为KMJ2的5日简单移动平均
+        if i >= period + 4:
+            kmj3[i] = (kmj2[i] + kmj2[i - 1] + kmj2[i - 2] + kmj2[i - 3] + kmj2[i - 4]) / 5
+    return kmj1, kmj2, kmj3
+
+@lru_cache(maxsize=256)
+def _kmj_from_bytes(ohlc_bytes):
+    """按OHLC原始字节缓存KMJ计算结果，Streamlit重跑时相同数据不再重复计算"""
+    open_, high, low, close = np.frombuffer(ohlc_bytes, dtype=np.float64).reshape(4, -1)
+    return _kmj_kernel(low, high, open_, close)
+
+def _add_kmj_indicators(df):
+    """在df上原地写入KMJ1/KMJ2/KMJ3和KMJ_TREND列，不做拷贝"""
+    # KMJ1/KMJ2/KMJ3在一个编译好的循环里一次算完，结果按OHLC内容缓存
+    ohlc = np.vstack([df[col].to_numpy(dtype=np.float64) for col in ('open', 'high', 'low', 'close')])
+    kmj1, kmj2, kmj3 = _kmj_from_bytes(ohlc.tobytes())
+    # 缓存中的数组是共享的，写入时拷贝一份
+    df['KMJ1'] = kmj1.copy()
+    df['KMJ2'] = kmj2.copy()
+    df['KMJ3'] = kmj3.copy()
+    
+    # 计算趋势，NaN参与比较为False，对应横盘0
+    df['KMJ_TREND'] = np.select([kmj2 > kmj3, kmj2 < kmj3], [1, -1], default=0).astype(np.int8)
 
 def calculate_kmj_indicators(data):
     """
@@ -13,34 +64,53 @@ def calculate_kmj_indicators(data):
         
     try:
         df = data.copy()
+        _add_kmj_indicators(df)
+        return df
+    except Exception as e:
+        print(f"计算KMJ指标时发生错误：{str(e)}")
+        return data
+
+def calculate_kmj_indicators_batch(data, code_col='code'):
+    """
+    批量计算多只股票的KMJ指标
+    data为长表，每只股票的行按日期排列，用code_col区分股票；
+    结果与逐只调用calculate_kmj_indicators一致，但整体只做一次向量化计算
+    """
+    if data is None or data.empty:
+        raise ValueError("输入数据不能为空")
         
-        # 计算KMJ1
-        df['KMJ1'] = (df['low'] + df['high'] + df['open'] + 3 * df['close']) / 6
+    try:
+        # 稳定排序让同一股票的行连续，且保持各自原有的日期顺序
+        df = data.sort_values(code_col, kind='stable', ignore_index=True)
+        position = df.groupby(code_col, sort=False).cumcount().to_numpy()
         
-        # 计算KMJ2 (20日加权移动平均)
-        weights = np.array([1/(i+1) for i in range(20)])
-        weights = weights[::-1]  # 反转权重，使最近的数据权重最大
-        weights = weights / weights.sum()  # 归一化权重
+        # 价格列一次取成NumPy数组，后续都在数组上计算，最后统一写回
+        open_, high, low, close = df[['open', 'high', 'low', 'close']].to_numpy(dtype=np.float64).T
         
-        df['KMJ2'] = pd.Series(index=df.index, dtype=float)
-        for i in range(len(df)):
-            if i < 20:
-                df.iloc[i, df.columns.get_loc('KMJ2')] = np.nan
-            else:
-                values = df['KMJ1'].iloc[i-20:i].values
-                df.iloc[i, df.columns.get_loc('KMJ2')] = np.sum(values * weights)
+        # 计算KMJ1
+        kmj1 = (low + high + open_ + 3 * close) / 6
+        
+        # 计算KMJ2 (20日加权移动平均，不含当日)，权重与单只股票版本相同
+        kmj2 = np.full(len(df), np.nan)
+        if len(df) > 20:
+            kmj2[20:] = np.lib.stride_tricks.sliding_window_view(kmj1[:-1], 20) @ KMJ2_WEIGHTS
+        # 窗口跨越了上一只股票的数据，置为NaN
+        kmj2[position < 20] = np.nan
         
-        # 计算KMJ3 (5日简单移动平均)
-        df['KMJ3'] = df['KMJ2'].rolling(window=5).mean()
+        # 计算KMJ3 (5日简单移动平均)，每只股票前20个KMJ2为NaN，跨股票的窗口自然为NaN
+        kmj3 = np.full(len(df), np.nan)
+        if len(df) >= 5:
+            kmj3[4:] = np.lib.stride_tricks.sliding_window_view(kmj2, 5).mean(axis=-1)
         
+        df['KMJ1'] = kmj1
+        df['KMJ2'] = kmj2
+        df['KMJ3'] = kmj3
         # 计算趋势
-        df['KMJ_TREND'] = 0
-        df.loc[df['KMJ2'] > df['KMJ3'], 'KMJ_TREND'] = 1
-        df.loc[df['KMJ2'] < df['KMJ3'], 'KMJ_TREND'] = -1
+        df['KMJ_TREND'] = np.select([kmj2 > kmj3, kmj2 < kmj3], [1, -1], default=0).astype(np.int8)
         
         return df
     except Exception as e:
-        print(f"计算KMJ指标时发生错误：{str(e)}")
+        print(f"批量计算KMJ指标时发生错误：{str(e)}")
         return data
 
 def get_kmj_signals(data):
@@ -50,26 +120,23 @@ def get_kmj_signals(data):
     卖出信号：KMJ2下穿KMJ3
     """
     try:
+        # 只拷贝一次，缺少的KMJ指标直接写在这份拷贝上
         df = data.copy()
-        
-        # 计算KMJ指标
         if 'KMJ2' not in df.columns or 'KMJ3' not in df.columns:
-            df = calculate_kmj_indicators(df)
+            _add_kmj_indicators(df)
+        
+        # 用KMJ2-KMJ3的符号在前一天与当天之间的变化判断交叉，NaN的符号参与比较时结果为False
+        sign = np.sign(df['KMJ2'].to_numpy(dtype=np.float64) - df['KMJ3'].to_numpy(dtype=np.float64))
         
-        # 初始化买卖信号列
-        df['KMJ_BUY_SIGNAL'] = False
-        df['KMJ_SELL_SIGNAL'] = False
+        buy = np.zeros(len(df), dtype=bool)
+        sell = np.zeros(len(df), dtype=bool)
+        # 上穿（买入信号）
+        buy[1:] = (sign[:-1] < 0) & (sign[1:] > 0)
+        # 下穿（卖出信号）
+        sell[1:] = (sign[:-1] > 0) & (sign[1:] < 0)
         
-        # 计算交叉信号
-        for i in range(1, len(df)):
-            # 上穿（买入信号）
-            if df['KMJ2'].iloc[i-1] < df['KMJ3'].iloc[i-1] and \
-               df['KMJ2'].iloc[i] > df['KMJ3'].iloc[i]:
-                df.loc[df.index[i], 'KMJ_BUY_SIGNAL'] = True
-            # 下穿（卖出信号）
-            elif df['KMJ2'].iloc[i-1] > df['KMJ3'].iloc[i-1] and \
-                 df['KMJ2'].iloc[i] < df['KMJ3'].iloc[i]:
-                df.loc[df.index[i], 'KMJ_SELL_SIGNAL'] = True
+        df['KMJ_BUY_SIGNAL'] = buy
+        df['KMJ_SELL_SIGNAL'] = sell
         
         return df
     except Exception as e:
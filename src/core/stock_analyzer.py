@@ -1,6 +1,52 @@
 import pandas as pd
 import numpy as np
 from .kmj_indicator import calculate_kmj_indicators, get_kmj_signals
+from ._njit import njit
+
+@njit(cache=True, error_model='numpy')
+def _score_kernel(close, volume, kmj2, kmj3, trend, has_kmj, has_trend):
+    """技术评分的数值核心，volume为空数组表示没有成交量数据"""
+    n = close.shape[0]
+    
+    # 基础分数为50分
+    score = 50.0
+    
+    # 趋势得分 (最高30分)
+    if has_trend:
+        if trend == 1:  # 上涨趋势
+            score += 30
+        elif trend == -1:  # 下跌趋势
+            score -= 30
+            
+    # KMJ指标得分 (最高20分)，KMJ2与KMJ3的距离越大表示趋势越强
+    if has_kmj:
+        kmj_diff = abs(kmj2 - kmj3) / kmj3 * 100
+        score += kmj_diff if kmj_diff < 20 else 20.0
+        
+    # 动量得分 (最高20分)
+    if n > 5:
+        # 最近5天的涨幅
+        price_change = (close[n - 1] / close[n - 6] - 1) * 100
+        if price_change > 0:
+            score += price_change if price_change < 20 else 20.0
+        else:
+            score -= abs(price_change) if abs(price_change) < 20 else 20.0
+            
+    # 成交量得分 (最高10分)
+    if n > 5 and volume.shape[0] > 0:
+        # 最近5天的平均成交量，与前5天平均成交量相比
+        avg_vol = np.nanmean(volume[n - 5:])
+        prev_avg_vol = np.nanmean(volume[n - 10:n - 5]) if n > 10 else np.nanmean(volume)
+        
+        if not np.isnan(avg_vol) and not np.isnan(prev_avg_vol) and prev_avg_vol > 0:
+            vol_change = (avg_vol / prev_avg_vol - 1) * 100
+            if vol_change > 0:
+                score += vol_change if vol_change < 10 else 10.0
+            else:
+                score -= abs(vol_change) if abs(vol_change) < 10 else 10.0
+                
+    # 确保分数在0-100之间
+    return max(0.0, min(100.0, score))
 
 def calculate_technical_score(data):
     """计算技术分析得分"""
@@ -13,51 +59,17 @@ def calculate_technical_score(data):
             data = calculate_kmj_indicators(data)
             data = get_kmj_signals(data)
             
-        # 获取最新的数据
-        latest = data.iloc[-1]
+        # 一次性取出numpy数组，数值计算交给_score_kernel
+        columns = data.columns
+        has_kmj = 'KMJ2' in columns and 'KMJ3' in columns
+        has_trend = 'KMJ_TREND' in columns
+        close = data['close'].to_numpy(dtype=np.float64)
+        volume = data['volume'].to_numpy(dtype=np.float64) if 'volume' in columns else np.empty(0)
+        kmj2 = data['KMJ2'].to_numpy(dtype=np.float64)[-1] if has_kmj else np.nan
+        kmj3 = data['KMJ3'].to_numpy(dtype=np.float64)[-1] if has_kmj else np.nan
+        trend = data['KMJ_TREND'].to_numpy(dtype=np.float64)[-1] if has_trend else np.nan
         
-        # 基础分数为50分
-        score = 50.0
-        
-        # 趋势得分 (最高30分)
-        if 'KMJ_TREND' in latest:
-            if latest['KMJ_TREND'] == 1:  # 上涨趋势
-                score += 30
-            elif latest['KMJ_TREND'] == -1:  # 下跌趋势
-                score -= 30
-                
-        # KMJ指标得分 (最高20分)
-        if 'KMJ2' in latest and 'KMJ3' in latest:
-            # KMJ2与KMJ3的距离，距离越大表示趋势越强
-            kmj_diff = abs(latest['KMJ2'] - latest['KMJ3']) / latest['KMJ3'] * 100
-            kmj_score = min(20, kmj_diff)
-            score += kmj_score
-            
-        # 动量得分 (最高20分)
-        if len(data) > 5:
-            # 最近5天的涨幅
-            price_change = (latest['close'] / data.iloc[-6]['close'] - 1) * 100
-            if price_change > 0:
-                score += min(20, price_change)
-            else:
-                score -= min(20, abs(price_change))
-                
-        # 成交量得分 (最高10分)
-        if 'volume' in data.columns and len(data) > 5:
-            # 最近5天的平均成交量
-            avg_vol = data['volume'].tail(5).mean()
-            # 与前5天平均成交量相比
-            prev_avg_vol = data['volume'].iloc[-10:-5].mean() if len(data) > 10 else data['volume'].mean()
-            
-            if not np.isnan(avg_vol) and not np.isnan(prev_avg_vol) and prev_avg_vol > 0:
-                vol_change = (avg_vol / prev_avg_vol - 1) * 100
-                if vol_change > 0:
-                    score += min(10, vol_change)
-                else:
-                    score -= min(10, abs(vol_change))
-                    
-        # 确保分数在0-100之间
-        return round(max(0, min(100, score)), 2)
+        return round(float(_score_kernel(close, volume, kmj2, kmj3, trend, has_kmj, has_trend)), 2)
     except Exception as e:
         print(f"计算技术得分时发生错误：{str(e)}")
         return 0.0 
\ No newline at end of file
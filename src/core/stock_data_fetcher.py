@@ -2,166 +2,214 @@ import baostock as bs
 import pandas as pd
 from datetime import datetime, timedelta
 import logging
+from contextlib import contextmanager
+from src.utils.cache import FileCache, last_trade_date
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def get_stock_list():
-    """获取股票列表"""
-    try:
-        # 登录系统
+# 股票列表和行业分类在交易日内不会变化，按交易日缓存到磁盘，重启后也不必重新登录查询
+STOCK_LIST_CACHE = FileCache('stock_list')
+INDUSTRY_CACHE = FileCache('industry')
+# 日K线按 代码_天数_交易日 缓存
+HISTORY_CACHE = FileCache('history')
+
+# 当前嵌套的baostock会话层数
+_bs_depth = 0
+
+@contextmanager
+def bs_session():
+    """baostock登录会话，可以嵌套使用，只有最外层负责登录和登出；登录失败抛出ConnectionError"""
+    global _bs_depth
+    if _bs_depth == 0:
         lg = bs.login()
         if lg.error_code != '0':
-            logger.error('login error: %s' % lg.error_msg)
-            return pd.DataFrame()
-            
-        # 获取股票基础信息
-        logger.info("Getting stock list from baostock...")
-        rs = bs.query_stock_basic()
-        if rs.error_code != '0':
-            logger.error(f'query_stock_basic error: {rs.error_msg}')
-            return pd.DataFrame()
+            raise ConnectionError(f'login error: {lg.error_msg}')
+    _bs_depth += 1
+    try:
+        yield
+    finally:
+        _bs_depth -= 1
+        if _bs_depth == 0:
+            bs.logout()
+
+def get_stock_list():
+    """获取股票列表，按交易日缓存"""
+    return STOCK_LIST_CACHE.get_or_fetch(last_trade_date(), _fetch_stock_list)
+
+def _fetch_stock_list():
+    """从baostock查询股票列表"""
+    try:
+        # 登录系统，行业数据查询复用同一个会话
+        with bs_session():
+            # 获取股票基础信息
+            logger.info("Getting stock list from baostock...")
+            rs = bs.query_stock_basic()
+            if rs.error_code != '0':
+                logger.error(f'query_stock_basic error: {rs.error_msg}')
+                return pd.DataFrame()
             
-        # 获取数据
-        data_list = []
-        while (rs.error_code == '0') & rs.next():
-            data_list.append(rs.get_row_data())
+            # 获取数据
+            data_list = []
+            while (rs.error_code == '0') & rs.next():
+                data_list.append(rs.get_row_data())
         
-        # 创建DataFrame
-        stocks_df = pd.DataFrame(data_list, columns=rs.fields)
+            # 创建DataFrame
+            stocks_df = pd.DataFrame(data_list, columns=rs.fields)
         
-        # 获取行业信息
-        industry_df = get_industry_data()
-        if not industry_df.empty:
-            stocks_df = stocks_df.merge(industry_df, on='code', how='left')
+            # 获取行业信息
+            industry_df = get_industry_data()
+            if not industry_df.empty:
+                stocks_df = stocks_df.merge(industry_df, on='code', how='left')
             
-        # 初始化技术得分列
-        stocks_df['technical_score'] = 0.0
+            # 初始化技术得分列
+            stocks_df['technical_score'] = 0.0
         
-        # 只保留A股
-        stocks_df = stocks_df[stocks_df['type'] == '1']
+            # 只保留A股
+            stocks_df = stocks_df[stocks_df['type'] == '1']
         
-        # 确保必要的列存在
-        required_columns = ['code', 'code_name', 'industry']
-        for col in required_columns:
-            if col not in stocks_df.columns:
-                stocks_df[col] = ''
+            # 确保必要的列存在
+            required_columns = ['code', 'code_name', 'industry']
+            for col in required_columns:
+                if col not in stocks_df.columns:
+                    stocks_df[col] = ''
                 
-        # 重命名列
-        stocks_df = stocks_df.rename(columns={
-            'code': 'symbol',
-            'code_name': 'name'
-        })
+            # 重命名列
+            stocks_df = stocks_df.rename(columns={
+                'code': 'symbol',
+                'code_name': 'name'
+            })
         
-        # 清理股票代码（去掉市场前缀）
-        stocks_df['symbol'] = stocks_df['symbol'].apply(lambda x: x.split('.')[-1])
+            # 清理股票代码（去掉市场前缀）
+            stocks_df['symbol'] = stocks_df['symbol'].apply(lambda x: x.split('.')[-1])
         
-        return stocks_df
+            return stocks_df
         
     except Exception as e:
         logger.error(f"Error getting stock list: {str(e)}")
         return pd.DataFrame()
-    finally:
-        bs.logout()
 
 def get_industry_data():
-    """获取行业数据"""
+    """获取行业数据，按交易日缓存"""
+    return INDUSTRY_CACHE.get_or_fetch(last_trade_date(), _fetch_industry_data)
+
+def _fetch_industry_data():
+    """从baostock查询行业分类数据"""
     try:
         # 登录系统
-        lg = bs.login()
-        if lg.error_code != '0':
-            logger.error('login error: %s' % lg.error_msg)
-            return pd.DataFrame()
-            
-        # 获取行业分类数据
-        rs = bs.query_stock_industry()
-        if rs.error_code != '0':
-            logger.error(f'query_stock_industry error: {rs.error_msg}')
-            return pd.DataFrame()
+        with bs_session():
+            # 获取行业分类数据
+            rs = bs.query_stock_industry()
+            if rs.error_code != '0':
+                logger.error(f'query_stock_industry error: {rs.error_msg}')
+                return pd.DataFrame()
             
-        # 获取数据
-        industry_list = []
-        while (rs.error_code == '0') & rs.next():
-            industry_list.append(rs.get_row_data())
+            # 获取数据
+            industry_list = []
+            while (rs.error_code == '0') & rs.next():
+                industry_list.append(rs.get_row_data())
             
-        # 创建DataFrame
-        if industry_list:
-            industry_df = pd.DataFrame(industry_list, columns=rs.fields)
-            logger.info(f"Available industry columns: {industry_df.columns.tolist()}")
+            # 创建DataFrame
+            if industry_list:
+                industry_df = pd.DataFrame(industry_list, columns=rs.fields)
+                logger.info(f"Available industry columns: {industry_df.columns.tolist()}")
             
-            # 确保必要的列存在
-            if 'industry' not in industry_df.columns:
-                industry_df['industry'] = '其他'
+                # 确保必要的列存在
+                if 'industry' not in industry_df.columns:
+                    industry_df['industry'] = '其他'
                 
-            # 处理空值和无效值
-            industry_df['industry'] = industry_df['industry'].fillna('其他')
-            industry_df['industry'] = industry_df['industry'].replace('', '其他')
+                # 处理空值和无效值：空值和空字符串用同一个掩码一次替换
+                industry = industry_df['industry']
+                industry_df['industry'] = industry.mask(industry.isna() | (industry == ''), '其他')
             
-            # 清理股票代码
-            industry_df['code'] = industry_df['code'].apply(lambda x: x.split('.')[-1])
+                # 清理股票代码
+                industry_df['code'] = industry_df['code'].apply(lambda x: x.split('.')[-1])
             
-            return industry_df[['code', 'industry']]
+                return industry_df[['code', 'industry']]
             
-        return pd.DataFrame()
+            return pd.DataFrame()
         
     except Exception as e:
         logger.error(f"Error getting industry data: {str(e)}")
         return pd.DataFrame()
-    finally:
-        bs.logout()
+
+def _query_history(stock_code, start_date, end_date):
+    """查询单只股票的日K线数据，调用前需已登录baostock"""
+    # 添加市场前缀
+    if stock_code.startswith('6'):
+        bs_code = f"sh.{stock_code}"
+    else:
+        bs_code = f"sz.{stock_code}"
+        
+    rs = bs.query_history_k_data_plus(
+        bs_code,
+        "date,open,high,low,close,volume",
+        start_date=start_date.strftime('%Y-%m-%d'),
+        end_date=end_date.strftime('%Y-%m-%d'),
+        frequency="d",
+        adjustflag="3"
+    )
+    
+    if rs.error_code != '0':
+        logger.error(f'query_history_k_data_plus error: {rs.error_msg}')
+        return pd.DataFrame()
+        
+    data_list = []
+    while (rs.error_code == '0') & rs.next():
+        data_list.append(rs.get_row_data())
+        
+    if data_list:
+        df = pd.DataFrame(data_list, columns=rs.fields)
+        # 转换数据类型
+        numeric_cols = ['open', 'high', 'low', 'close', 'volume']
+        # baostock返回的都是字符串，整块转成float64，日期按固定格式解析，免去逐列apply和格式推断
+        df[numeric_cols] = df[numeric_cols].astype('float64')
+        df['date'] = pd.to_datetime(df['date'], format='%Y-%m-%d')
+        return df
+        
+    return pd.DataFrame()
 
 def get_stock_data(stock_code, days=30):
-    """获取股票历史数据"""
+    """
+    获取股票历史数据
+    stock_code为代码列表时只登录一次批量获取，返回带code列的长表
+    每只股票的数据按交易日缓存，全部命中缓存时不再登录baostock
+    """
     try:
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=days)
+        codes = [stock_code] if isinstance(stock_code, str) else list(stock_code)
+        trade_date = last_trade_date()
+        history = {code: HISTORY_CACHE.get(f"{code}_{days}_{trade_date}") for code in codes}
+        missing = [code for code, df in history.items() if df is None]
         
-        # 尝试从baostock获取数据
-        lg = bs.login()
-        if lg.error_code != '0':
-            logger.error('login error: %s' % lg.error_msg)
-            return pd.DataFrame()
-            
-        # 添加市场前缀
-        if stock_code.startswith('6'):
-            bs_code = f"sh.{stock_code}"
-        else:
-            bs_code = f"sz.{stock_code}"
-            
-        rs = bs.query_history_k_data_plus(
-            bs_code,
-            "date,open,high,low,close,volume",
-            start_date=start_date.strftime('%Y-%m-%d'),
-            end_date=end_date.strftime('%Y-%m-%d'),
-            frequency="d",
-            adjustflag="3"
-        )
-        
-        if rs.error_code != '0':
-            logger.error(f'query_history_k_data_plus error: {rs.error_msg}')
-            return pd.DataFrame()
-            
-        data_list = []
-        while (rs.error_code == '0') & rs.next():
-            data_list.append(rs.get_row_data())
+        if missing:
+            _fetch_history(missing, days, trade_date, history)
             
-        if data_list:
-            df = pd.DataFrame(data_list, columns=rs.fields)
-            # 转换数据类型
-            numeric_cols = ['open', 'high', 'low', 'close', 'volume']
-            df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric)
-            df['date'] = pd.to_datetime(df['date'])
-            return df
+        if isinstance(stock_code, str):
+            df = history[stock_code]
+            return df if df is not None else pd.DataFrame()
             
-        return pd.DataFrame()
+        frames = [df.assign(code=code) for code, df in history.items() if df is not None and not df.empty]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
         
     except Exception as e:
         logger.error(f"Error getting stock data: {str(e)}")
         return pd.DataFrame()
-    finally:
-        bs.logout()
 
-# 确保程序退出时登出baostock
-import atexit
-atexit.register(bs.logout) 
\ No newline at end of file
+def _fetch_history(codes, days, trade_date, history):
+    """在一个baostock会话中查询codes的日K线，结果写入history并缓存"""
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=days)
+    
+    try:
+        with bs_session():
+            for code in codes:
+                try:
+                    df = _query_history(code, start_date, end_date)
+                    if not df.empty:
+                        HISTORY_CACHE.set(f"{code}_{days}_{trade_date}", df)
+                        history[code] = df
+                except Exception as e:
+                    logger.error(f"Error getting stock data for {code}: {str(e)}")
+    except ConnectionError as e:
+        logger.error(str(e))
@@ -1,36 +1,94 @@
-import yfinance as yf
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv
 import json
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import baostock as bs
 import time
 import re
+import functools
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from src.utils.cache import FileCache, last_trade_date
 
 # Load environment variables
 load_dotenv()
 
-def ensure_baostock_login():
-    """Ensure baostock is logged in before making queries"""
-    try:
-        bs.logout()  # Logout first to ensure clean state
-    except:
-        pass
+# yfinance备用源并发请求的线程数
+YFINANCE_WORKERS = 4
+
+# 全市场技术评分的并行进程数，baostock每个进程各自登录，进程数不宜过多
+SCORE_WORKERS = min(8, os.cpu_count() or 1)
+
+# 模块级复用的HTTP会话，连接池保持长连接，避免每次请求重新建立连接；对限流和服务端错误自动重试
+HTTP_SESSION = requests.Session()
+HTTP_SESSION.headers['User-Agent'] = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36'
+_HTTP_ADAPTER = HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=50,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+)
+HTTP_SESSION.mount('http://', _HTTP_ADAPTER)
+HTTP_SESSION.mount('https://', _HTTP_ADAPTER)
+
+# 当天行情的内存缓存 {ts_code: (获取时间, DataFrame)}，QUOTE_TTL秒内重复请求直接复用
+QUOTE_TTL = 60
+_quote_cache = {}
+
+# 日线和股票列表在当日日线发布后不再变化，按最近交易日缓存到磁盘，重复请求和Streamlit重跑直接读文件
+STOCK_LIST_CACHE = FileCache('data_stock_list')
+INDUSTRY_CACHE = FileCache('data_industry')
+HISTORY_CACHE = FileCache('data_history')
+BAOSTOCK_HISTORY_CACHE = FileCache('data_history_baostock')
+
+# 代码清洗用到的正则，模块加载时编译一次
+_CODE_RE = re.compile(r'^s[hz]\.?|\.S[SZ]$')
+
+# baostock返回的"用户未登录"错误码，会话过期时重新登录后重试一次
+BS_NOT_LOGGED_IN = '10001001'
+
+# 本进程的baostock会话是否已登录，整个进程复用同一个会话，退出时由atexit登出
+_bs_logged_in = False
+
+def ensure_baostock_login(force=False):
+    """Ensure baostock is logged in before making queries; reuse the session unless force"""
+    global _bs_logged_in
+    if _bs_logged_in and not force:
+        return None
     
     login_result = bs.login()
     if login_result.error_code != '0':
+        _bs_logged_in = False
         raise Exception(f"Failed to login to baostock: {login_result.error_msg}")
+    _bs_logged_in = True
     return login_result
 
+def _bs_query(query, *args, **kwargs):
+    """执行baostock查询，会话过期时重新登录并重试一次"""
+    ensure_baostock_login()
+    rs = query(*args, **kwargs)
+    if rs.error_code == BS_NOT_LOGGED_IN:
+        ensure_baostock_login(force=True)
+        rs = query(*args, **kwargs)
+    return rs
+
 # Initialize baostock
 ensure_baostock_login()
 
+def _is_a_share(ts_code):
+    """是否为 600000.SS / 000001.SZ 形式的A股代码，用字符串比较代替正则匹配"""
+    return (len(ts_code) == 9 and ts_code[6] == '.' and ts_code[-2:] in ('SS', 'SZ')
+            and ts_code.isascii() and ts_code[:6].isdigit())
+
+# A股代码集合固定，结果为不可变元组，缓存后重复调用直接查表
+@functools.lru_cache(maxsize=8192)
 def format_stock_code(code):
     """Format stock code for different data sources"""
     # Remove any existing prefixes or suffixes
-    code = re.sub(r'^s[hz]\.?|\.S[SZ]$', '', code)
+    code = _CODE_RE.sub('', code)
     
     # Ensure 6 digits
     if len(code) > 6:
@@ -51,7 +109,7 @@ def get_stock_list_from_sina():
     """从新浪财经获取股票列表"""
     try:
         url = "http://vip.stock.finance.sina.com.cn/quotes_service/api/json_v2.php/Market_Center.getHQNodeData?page=1&num=4000&sort=symbol&asc=1&node=hs_a"
-        response = requests.get(url, timeout=10)
+        response = HTTP_SESSION.get(url, timeout=10)
         stocks_data = json.loads(response.text)
         
         if not isinstance(stocks_data, list) or not stocks_data:
@@ -83,15 +141,13 @@ def get_stock_list_from_sina():
 
 def get_industry_data():
     """获取行业数据"""
+    return INDUSTRY_CACHE.get_or_fetch(last_trade_date(), _fetch_industry_data)
+
+def _fetch_industry_data():
+    """从baostock查询行业分类"""
     try:
-        # 登录系统
-        lg = bs.login()
-        if lg.error_code != '0':
-            print('login error: %s' % lg.error_msg)
-            return pd.DataFrame()
-            
         # 获取行业分类数据
-        rs = bs.query_stock_industry()
+        rs = _bs_query(bs.query_stock_industry)
         if rs.error_code != '0':
             print(f'query_stock_industry error: {rs.error_msg}')
             return pd.DataFrame()
@@ -110,9 +166,9 @@ def get_industry_data():
             if 'industry' not in industry_df.columns:
                 industry_df['industry'] = '其他'
                 
-            # 处理空值和无效值
-            industry_df['industry'] = industry_df['industry'].fillna('其他')
-            industry_df['industry'] = industry_df['industry'].replace('', '其他')
+            # 处理空值和无效值：空值和空字符串用同一个掩码一次替换
+            industry = industry_df['industry']
+            industry_df['industry'] = industry.mask(industry.isna() | (industry == ''), '其他')
             
             # 清理股票代码
             industry_df['code'] = industry_df['code'].apply(lambda x: x.split('.')[-1])
@@ -124,21 +180,42 @@ def get_industry_data():
     except Exception as e:
         print(f"Error getting industry data: {str(e)}")
         return pd.DataFrame()
-    finally:
-        bs.logout()
+
+def _fetch_ohlcv(symbol):
+    """获取单只股票近60天日线，供进程池调用；只回传评分需要的列，失败时返回None"""
+    try:
+        stock_data = get_stock_data(symbol, days=60)
+        if not stock_data.empty:
+            frame = stock_data[['open', 'high', 'low', 'close', 'volume']]
+            return frame.assign(code=symbol)
+    except Exception as e:
+        print(f"Error fetching data for {symbol}: {str(e)}")
+    return None
+
+def analyze_universe(symbols):
+    """并行获取一批股票的日线并计算技术得分，返回以代码为索引的Series，取数失败的记0
+
+    取数受网络IO限制，分发到多个进程（baostock会话不能跨线程共用，子进程启动时各自登录）；
+    评分是CPU计算，取回后在主进程拼成一张表一次算完，不再每只股票单独算一遍指标。
+    """
+    symbols = list(symbols)
+    with ProcessPoolExecutor(max_workers=SCORE_WORKERS, initializer=ensure_baostock_login, initargs=(True,)) as executor:
+        frames = [f for f in executor.map(_fetch_ohlcv, symbols, chunksize=32) if f is not None]
+    
+    from stock_analyzer import calculate_technical_scores
+    scores = calculate_technical_scores(pd.concat(frames, ignore_index=True)) if frames else pd.Series(dtype=float)
+    return scores.reindex(symbols, fill_value=0.0)
 
 def get_stock_list():
     """获取股票列表"""
+    return STOCK_LIST_CACHE.get_or_fetch(last_trade_date(), _fetch_stock_list)
+
+def _fetch_stock_list():
+    """从baostock查询全部A股并计算技术得分"""
     try:
-        # 登录系统
-        lg = bs.login()
-        if lg.error_code != '0':
-            print('login error: %s' % lg.error_msg)
-            return pd.DataFrame()
-            
         # 获取股票基础信息
         print("Getting stock list from baostock...")
-        rs = bs.query_stock_basic()
+        rs = _bs_query(bs.query_stock_basic)
         if rs.error_code != '0':
             print(f'query_stock_basic error: {rs.error_msg}')
             return pd.DataFrame()
@@ -174,33 +251,49 @@ def get_stock_list():
             'code_name': 'name'
         })
         
-        # 更新技术得分
-        for idx, row in stocks_df.iterrows():
-            try:
-                # 获取股票数据
-                stock_data = get_stock_data(row['symbol'], days=60)
-                if not stock_data.empty:
-                    # 计算技术得分
-                    from stock_analyzer import calculate_technical_score
-                    score = calculate_technical_score(stock_data)
-                    stocks_df.loc[idx, 'technical_score'] = score
-            except Exception as e:
-                print(f"Error calculating technical score for {row['symbol']}: {str(e)}")
-                continue
-                
+        # 更新技术得分：并行取数，主进程批量评分
+        stocks_df['technical_score'] = analyze_universe(stocks_df['symbol']).to_numpy()
+        
         return stocks_df
         
     except Exception as e:
         print(f"Error getting stock list: {str(e)}")
         return pd.DataFrame()
-    finally:
-        bs.logout()
+
+def _to_float_block(block):
+    """把若干列整块转换成float64；含无法解析的值时逐列按NaN处理"""
+    try:
+        return block.astype('float64')
+    except (ValueError, TypeError):
+        return block.apply(pd.to_numeric, errors='coerce').astype('float64')
+
+def _rows_to_frame(rows, fields, numeric_cols=()):
+    """把baostock逐行返回的字符串列表转成DataFrame
+
+    用zip一次转置成列，数值列直接解析为float64，不经过object二维数组；
+    含无法解析的值时该列按NaN处理。
+    """
+    columns = dict(zip(fields, zip(*rows)))
+    data = {}
+    for name in fields:
+        values = columns.get(name, ())
+        if name in numeric_cols:
+            try:
+                data[name] = np.array(values, dtype=np.float64)
+            except ValueError:
+                data[name] = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy(dtype=np.float64)
+        else:
+            data[name] = list(values)
+    return pd.DataFrame(data, columns=fields)
 
 def get_stock_data_baostock(symbol, days=60):
     """Get stock data using baostock"""
+    key = f"{symbol}_{days}_{last_trade_date()}"
+    return BAOSTOCK_HISTORY_CACHE.get_or_fetch(key, lambda: _fetch_stock_data_baostock(symbol, days))
+
+def _fetch_stock_data_baostock(symbol, days):
+    """Query daily bars from baostock"""
     try:
-        ensure_baostock_login()
-        
         # Format stock code for baostock
         baostock_code, _ = format_stock_code(symbol)
         
@@ -208,7 +301,8 @@ def get_stock_data_baostock(symbol, days=60):
         end_date = datetime.now()
         start_date = end_date - timedelta(days=days*2)
         
-        rs = bs.query_history_k_data_plus(
+        rs = _bs_query(
+            bs.query_history_k_data_plus,
             baostock_code,
             "date,open,high,low,close,volume",
             start_date=start_date.strftime('%Y-%m-%d'),
@@ -229,14 +323,12 @@ def get_stock_data_baostock(symbol, days=60):
             print(f"No data received from baostock for {baostock_code}")
             return None
         
-        df = pd.DataFrame(data_list, columns=['date', 'open', 'high', 'low', 'close', 'volume'])
-        
-        # Convert data types
+        # Convert data types while building the frame
         numeric_cols = ['open', 'high', 'low', 'close', 'volume']
-        for col in numeric_cols:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
+        df = _rows_to_frame(data_list, ['date'] + numeric_cols, numeric_cols)
         
-        df['date'] = pd.to_datetime(df['date']).dt.strftime('%Y%m%d')
+        # 日期对外保持YYYYMMDD字符串格式；baostock返回固定的YYYY-MM-DD，指定格式解析
+        df['date'] = pd.to_datetime(df['date'], format='%Y-%m-%d').dt.strftime('%Y%m%d')
         
         if len(df) > days:
             df = df.tail(days)
@@ -249,23 +341,23 @@ def get_stock_data_baostock(symbol, days=60):
 
 def get_stock_data(stock_code, days=60):
     """获取股票历史数据"""
+    key = f"{stock_code}_{days}_{last_trade_date()}"
+    return HISTORY_CACHE.get_or_fetch(key, lambda: _fetch_stock_data(stock_code, days))
+
+def _fetch_stock_data(stock_code, days):
+    """从baostock查询日线并计算KMJ指标"""
     try:
         end_date = datetime.now()
         start_date = end_date - timedelta(days=days)
         
-        # 尝试从baostock获取数据
-        lg = bs.login()
-        if lg.error_code != '0':
-            print('login error: %s' % lg.error_msg)
-            return pd.DataFrame()
-            
         # 添加市场前缀
         if stock_code.startswith('6'):
             bs_code = f"sh.{stock_code}"
         else:
             bs_code = f"sz.{stock_code}"
             
-        rs = bs.query_history_k_data_plus(
+        rs = _bs_query(
+            bs.query_history_k_data_plus,
             bs_code,
             "date,open,high,low,close,volume",
             start_date=start_date.strftime('%Y-%m-%d'),
@@ -283,11 +375,10 @@ def get_stock_data(stock_code, days=60):
             data_list.append(rs.get_row_data())
             
         if data_list:
-            df = pd.DataFrame(data_list, columns=rs.fields)
-            # 转换数据类型
+            # 建表时直接把数值列解析为float64，日期按固定格式解析，免去逐列apply和格式推断
             numeric_cols = ['open', 'high', 'low', 'close', 'volume']
-            df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric)
-            df['date'] = pd.to_datetime(df['date'])
+            df = _rows_to_frame(data_list, rs.fields, numeric_cols)
+            df['date'] = pd.to_datetime(df['date'], format='%Y-%m-%d')
             
             # 计算KMJ指标
             from stock_analyzer import calculate_kmj_indicators
@@ -300,61 +391,92 @@ def get_stock_data(stock_code, days=60):
     except Exception as e:
         print(f"Error getting stock data: {str(e)}")
         return pd.DataFrame()
-    finally:
-        bs.logout()
+
+def _fetch_yfinance_quote(ts_code, max_retries=3, retry_delay=2):
+    """从yfinance获取单只股票当天的行情，失败时按retry_delay重试"""
+    # yfinance只在baostock取不到数据时作为备用源，导入较慢，用到时再导入
+    import yfinance as yf
+    
+    for attempt in range(max_retries):
+        try:
+            _, yf_code = format_stock_code(ts_code)
+            
+            stock = yf.Ticker(yf_code)
+            today_data = stock.history(period='1d')
+            
+            if not today_data.empty:
+                today_data = today_data.reset_index()
+                today_data['ts_code'] = ts_code
+                return today_data
+            else:
+                raise ValueError(f"No data available from yfinance for {ts_code}")
+            
+        except Exception as e:
+            print(f"Attempt {attempt + 1}/{max_retries} - Error fetching data from yfinance for {ts_code}: {str(e)}")
+            if attempt < max_retries - 1:
+                time.sleep(retry_delay)
+    return None
+
+def _get_cached_quote(ts_code):
+    """返回未过期的缓存行情，没有则返回None"""
+    cached = _quote_cache.get(ts_code)
+    if cached is not None and time.time() - cached[0] < QUOTE_TTL:
+        return cached[1]
+    return None
 
 def get_realtime_quotes(ts_codes, max_retries=3, retry_delay=2):
     """Get current day's data for multiple stocks"""
-    results = []
-    for ts_code in ts_codes:
-        # For A-shares, try baostock first
-        if re.match(r'^[0-9]{6}\.(SS|SZ)$', ts_code):
-            try:
-                ensure_baostock_login()
-                baostock_code, _ = format_stock_code(ts_code)
-                
-                rs = bs.query_history_k_data_plus(
-                    baostock_code,
-                    "date,open,high,low,close,volume",
-                    start_date=datetime.now().strftime('%Y-%m-%d'),
-                    end_date=datetime.now().strftime('%Y-%m-%d'),
-                    frequency="d",
-                    adjustflag="3"
-                )
-                
-                if rs.error_code == '0':
-                    data_list = []
-                    while (rs.error_code == '0') and rs.next():
-                        data_list.append(rs.get_row_data())
+    quotes = {}
+    futures = {}
+    # baostock共用一个全局连接只能串行查询，yfinance是独立的HTTP请求；
+    # 需要备用源的代码一经确定就提交到线程池，与后续的baostock查询同时进行
+    with ThreadPoolExecutor(max_workers=YFINANCE_WORKERS) as executor:
+        for i, ts_code in enumerate(ts_codes):
+            cached = _get_cached_quote(ts_code)
+            if cached is not None:
+                quotes[i] = cached
+                continue
+            
+            # For A-shares, try baostock first
+            if _is_a_share(ts_code):
+                try:
+                    baostock_code, _ = format_stock_code(ts_code)
                     
-                    if data_list:
-                        today_data = pd.DataFrame(data_list, columns=['date', 'open', 'high', 'low', 'close', 'volume'])
-                        today_data['ts_code'] = ts_code
-                        results.append(today_data)
-                        continue
-            except Exception as e:
-                print(f"Error fetching data from baostock for {ts_code}: {str(e)}")
+                    rs = _bs_query(
+                        bs.query_history_k_data_plus,
+                        baostock_code,
+                        "date,open,high,low,close,volume",
+                        start_date=datetime.now().strftime('%Y-%m-%d'),
+                        end_date=datetime.now().strftime('%Y-%m-%d'),
+                        frequency="d",
+                        adjustflag="3"
+                    )
+                    
+                    if rs.error_code == '0':
+                        data_list = []
+                        while (rs.error_code == '0') and rs.next():
+                            data_list.append(rs.get_row_data())
+                        
+                        if data_list:
+                            today_data = pd.DataFrame(data_list, columns=['date', 'open', 'high', 'low', 'close', 'volume'])
+                            today_data['ts_code'] = ts_code
+                            quotes[i] = today_data
+                            _quote_cache[ts_code] = (time.time(), today_data)
+                            continue
+                except Exception as e:
+                    print(f"Error fetching data from baostock for {ts_code}: {str(e)}")
+            
+            # Try yfinance as backup
+            futures[i] = (ts_code, executor.submit(_fetch_yfinance_quote, ts_code, max_retries, retry_delay))
         
-        # Try yfinance as backup
-        for attempt in range(max_retries):
-            try:
-                _, yf_code = format_stock_code(ts_code)
-                
-                stock = yf.Ticker(yf_code)
-                today_data = stock.history(period='1d')
-                
-                if not today_data.empty:
-                    today_data = today_data.reset_index()
-                    today_data['ts_code'] = ts_code
-                    results.append(today_data)
-                    break
-                else:
-                    raise ValueError(f"No data available from yfinance for {ts_code}")
-                
-            except Exception as e:
-                print(f"Attempt {attempt + 1}/{max_retries} - Error fetching data from yfinance for {ts_code}: {str(e)}")
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay)
+        for i, (ts_code, future) in futures.items():
+            today_data = future.result()
+            if today_data is not None:
+                quotes[i] = today_data
+                _quote_cache[ts_code] = (time.time(), today_data)
+    
+    # 按传入顺序拼接结果
+    results = [quotes[i] for i in sorted(quotes)]
     
     if results:
         try:
@@ -368,9 +490,9 @@ def get_realtime_quotes(ts_codes, max_retries=3, retry_delay=2):
                 'Volume': 'volume'
             })
             
+            # baostock行情是字符串、yfinance已是数值，整块一次转成float64
             numeric_cols = ['open', 'high', 'low', 'close', 'volume']
-            for col in numeric_cols:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
+            df[numeric_cols] = _to_float_block(df[numeric_cols])
             
             return df
             
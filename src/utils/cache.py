@@ -0,0 +1,114 @@
+import os
+import re
+import time
+import pickle
+import logging
+from datetime import datetime, timedelta, time as dtime
+
+logger = logging.getLogger(__name__)
+
+# 默认缓存目录：项目根目录下的 .cache/
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    '.cache'
+)
+
+# 当天日线可用的时间：A股15:00收盘，但baostock约17:30才发布当日日线，
+# 在此之前取到的数据不含当天K线，不能记到当天的缓存键下，留出余量取18:00
+DAILY_DATA_READY = dtime(18, 0)
+
+# 按交易日失效的缓存键以交易日结尾（"<交易日>" 或 "..._<交易日>"）
+_TRADE_DATE_KEY = re.compile(r'(?:^|_)(\d{8})$')
+
+
+def last_trade_date(now=None):
+    """返回最近一个日线数据已发布的交易日的日期字符串(YYYYMMDD)
+
+    当天日线发布前算作上一个交易日，周末回退到周五；节假日不做特殊处理，
+    最多只是多生成一份内容相同的缓存。
+    """
+    now = now or datetime.now()
+    day = now.date()
+    if now.time() < DAILY_DATA_READY:
+        day -= timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day.strftime('%Y%m%d')
+
+
+class FileCache:
+    """基于pickle文件的简单磁盘缓存，每个键对应 .cache/<namespace>/<key>.pkl
+
+    键以交易日结尾的条目在写入新交易日的数据时清理掉更早交易日的文件，
+    目录大小只与一个交易日的数据量相当，不会随天数增长。
+    """
+
+    def __init__(self, namespace, cache_dir=None):
+        self.directory = os.path.join(cache_dir or DEFAULT_CACHE_DIR, namespace)
+        # 本进程已清理到的交易日，每个交易日只扫描一次目录
+        self._pruned_date = None
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def get(self, key, default=None, ttl=None):
+        """读取缓存，不存在、超过ttl秒或损坏时返回default"""
+        path = self._path(key)
+        if not os.path.exists(path):
+            return default
+        if ttl is not None and time.time() - os.path.getmtime(path) > ttl:
+            return default
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except Exception as e:
+            logger.warning(f"读取缓存失败 {path}: {str(e)}")
+            return default
+
+    def set(self, key, value):
+        """写入缓存，先写临时文件再替换，避免并发读到半个文件"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(key)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"写入缓存失败 {key}: {str(e)}")
+            return
+        match = _TRADE_DATE_KEY.search(key)
+        if match and (self._pruned_date is None or match.group(1) > self._pruned_date):
+            self._pruned_date = match.group(1)
+            self.prune(self._pruned_date)
+
+    def prune(self, trade_date):
+        """删除键中交易日早于trade_date的缓存文件，返回删除的文件数；不带交易日的键不受影响"""
+        removed = 0
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return 0
+        for name in names:
+            if not name.endswith('.pkl'):
+                continue
+            match = _TRADE_DATE_KEY.search(name[:-4])
+            if match and match.group(1) < trade_date:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                    removed += 1
+                except OSError:
+                    pass
+        if removed:
+            logger.info(f"清理过期缓存 {self.directory}: {removed} 个文件")
+        return removed
+
+    def get_or_fetch(self, key, fetch, ttl=None):
+        """命中缓存直接返回，否则调用fetch()获取并写入缓存；None和空DataFrame不缓存"""
+        value = self.get(key, ttl=ttl)
+        if value is not None:
+            return value
+        value = fetch()
+        if value is not None and not getattr(value, 'empty', False):
+            self.set(key, value)
+        return value
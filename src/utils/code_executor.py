@@ -3,6 +3,42 @@ import numpy as np
 import akshare as ak
 import datetime
 import json
+from concurrent.futures import ThreadPoolExecutor
+from src.utils.cache import FileCache, last_trade_date
+
+# orjson为可选依赖，安装后用它序列化结果；结果只含原生类型，两种序列化输出一致
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# akshare接口的磁盘缓存，日线按交易日失效，基本信息和行业变化很慢，缓存30天
+ONE_DAY = 24 * 3600
+# 交易日当天日线发布前，取到的数据可能带着盘中未定型的K线，只缓存几分钟
+INTRADAY_TTL = 5 * 60
+HIST_CACHE = FileCache('akshare/stock_zh_a_hist')
+INFO_CACHE = FileCache('akshare/stock_individual_info_em')
+INDUSTRY_CACHE = FileCache('akshare/stock_industry_category_cninfo')
+VALUATION_CACHE = FileCache('akshare/stock_a_lg_indicator')
+
+def _count_recent_true(mask, limit):
+    """统计布尔数组末尾连续为True的天数，最多统计limit天"""
+    recent = mask[len(mask) - min(limit, len(mask)):][::-1]
+    return len(recent) if recent.all() else int(np.argmin(recent))
+
+def _tail_rolling_mean(values, window, count):
+    """只计算末尾count个位置的window日滚动均值，与rolling(window).mean()对应位置的值一致"""
+    count = min(count, len(values))
+    out = np.full(count, np.nan)
+    k = min(count, len(values) - window + 1)
+    if k > 0:
+        out[count - k:] = np.lib.stride_tricks.sliding_window_view(values[len(values) - window - k + 1:], window).mean(axis=-1)
+    return out
+
+def _float_or_none(value):
+    """转为原生float，NaN转为None，与orjson对NaN的处理一致"""
+    value = float(value)
+    return None if np.isnan(value) else value
 
 def get_stock_data(stock_code):
     """
@@ -19,68 +55,76 @@ def get_stock_data(stock_code):
         else:
             full_code = f"{stock_code}.SZ"
             
-        # 获取股票历史数据
-        stock_data = ak.stock_zh_a_hist(symbol=full_code, period="daily", 
-                                      start_date=(datetime.datetime.now() - datetime.timedelta(days=365)).strftime('%Y%m%d'),
-                                      end_date=datetime.datetime.now().strftime('%Y%m%d'), 
-                                      adjust="qfq")
+        # 四个akshare接口互不依赖，并发请求，耗时取决于最慢的一个
+        now = datetime.datetime.now()
+        today = now.strftime('%Y%m%d')
+        trade_date = last_trade_date(now)
+        hist_ttl = INTRADAY_TTL if today != trade_date and now.weekday() < 5 else None
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            hist_future = executor.submit(
+                HIST_CACHE.get_or_fetch,
+                f"{stock_code}_{trade_date}",
+                lambda: ak.stock_zh_a_hist(symbol=full_code, period="daily", 
+                                           start_date=(datetime.datetime.now() - datetime.timedelta(days=365)).strftime('%Y%m%d'),
+                                           end_date=today, 
+                                           adjust="qfq"),
+                ttl=hist_ttl
+            )
+            info_future = executor.submit(INFO_CACHE.get_or_fetch, stock_code, lambda: ak.stock_individual_info_em(symbol=full_code), ttl=30 * ONE_DAY)
+            industry_future = executor.submit(INDUSTRY_CACHE.get_or_fetch, stock_code, lambda: ak.stock_industry_category_cninfo(symbol=stock_code), ttl=30 * ONE_DAY)
+            valuation_future = executor.submit(VALUATION_CACHE.get_or_fetch, stock_code, lambda: ak.stock_a_lg_indicator(symbol=full_code), ttl=ONE_DAY)
         
-        # 计算技术指标
-        # 20日均线
-        stock_data['MA20'] = stock_data['收盘'].rolling(window=20).mean()
-        # 120日成交量均线
-        stock_data['VOL120'] = stock_data['成交量'].rolling(window=120).mean()
+        # 获取股票历史数据
+        stock_data = hist_future.result()
         
         # 获取最新数据
         latest_data = stock_data.iloc[-1]
         prev_data = stock_data.iloc[-2]
         
+        # 计算技术指标：规则只看最近几天，只算末尾4天的20日均线和末尾3天的120日成交量均线
+        close = stock_data['收盘'].to_numpy(dtype=np.float64)
+        volume = stock_data['成交量'].to_numpy(dtype=np.float64)
+        ma20 = _tail_rolling_mean(close, 20, 4)
+        vol120 = _tail_rolling_mean(volume, 120, 3)
+        
         # 计算与20日均线的关系
-        above_ma20 = latest_data['收盘'] > latest_data['MA20']
+        above_ma20 = close[-1] > ma20[-1]
         
-        # 计算连续4天收盘价高于20日均线
-        days_above_ma20 = 0
-        for i in range(1, min(5, len(stock_data))):
-            if stock_data.iloc[-i]['收盘'] > stock_data.iloc[-i]['MA20']:
-                days_above_ma20 += 1
-            else:
-                break
+        # 计算连续4天收盘价高于20日均线（最多统计最近4天，且不超过数据长度-1）
+        close_above_ma20 = close[len(close) - len(ma20):] > ma20
+        days_above_ma20 = _count_recent_true(close_above_ma20, min(4, len(stock_data) - 1))
         
         # 计算成交量与120日均量线的关系
-        vol_above_ma120 = latest_data['成交量'] > latest_data['VOL120']
+        vol_above_ma120 = volume[-1] > vol120[-1]
         
         # 计算连续3天成交量高于120日均量线
-        days_vol_above_ma120 = 0
-        for i in range(1, min(4, len(stock_data))):
-            if stock_data.iloc[-i]['成交量'] > stock_data.iloc[-i]['VOL120']:
-                days_vol_above_ma120 += 1
-            else:
-                break
+        vol_above_vol120 = volume[len(volume) - len(vol120):] > vol120
+        days_vol_above_ma120 = _count_recent_true(vol_above_vol120, min(3, len(stock_data) - 1))
         
         # 计算量价齐升情况
         price_up = latest_data['收盘'] > prev_data['收盘']
         vol_up = latest_data['成交量'] > prev_data['成交量']
-        price_vol_up = price_up and vol_up
+        price_vol_up = bool(price_up and vol_up)
         
         # 获取股票基本信息
-        stock_info = ak.stock_individual_info_em(symbol=full_code)
+        stock_info = info_future.result()
         
         # 构建结果
         result = {
             "股票代码": stock_code,
             "股票名称": stock_info.iloc[0, 1] if not stock_info.empty else "未知",
-            "当前价格": float(latest_data['收盘']),
-            "涨跌幅": float(latest_data['涨跌幅']),
-            "成交量": float(latest_data['成交量']),
-            "成交额": float(latest_data['成交额']),
+            "当前价格": _float_or_none(latest_data['收盘']),
+            "涨跌幅": _float_or_none(latest_data['涨跌幅']),
+            "成交量": _float_or_none(latest_data['成交量']),
+            "成交额": _float_or_none(latest_data['成交额']),
             "技术指标": {
-                "MA20": float(latest_data['MA20']) if not np.isnan(latest_data['MA20']) else None,
-                "VOL120": float(latest_data['VOL120']) if not np.isnan(latest_data['VOL120']) else None,
+                "MA20": _float_or_none(ma20[-1]),
+                "VOL120": _float_or_none(vol120[-1]),
                 "高于20日均线": bool(above_ma20),
                 "连续高于20日均线天数": int(days_above_ma20),
                 "高于120日均量线": bool(vol_above_ma120),
                 "连续高于120日均量线天数": int(days_vol_above_ma120),
-                "量价齐升": bool(price_vol_up)
+                "量价齐升": price_vol_up
             },
             "杨凯指标": {
                 "多头持股条件": {
@@ -92,14 +136,14 @@ def get_stock_data(stock_code):
                 "空头观望条件": {
                     "均线系统": not above_ma20,
                     "量能系统": not vol_above_ma120,
-                    "满足条件": not above_ma20 or not vol_above_ma120
+                    "满足条件": bool(not above_ma20 or not vol_above_ma120)
                 }
             }
         }
         
         # 获取行业信息
         try:
-            industry_info = ak.stock_industry_category_cninfo(symbol=stock_code)
+            industry_info = industry_future.result()
             if not industry_info.empty:
                 result["行业"] = industry_info.iloc[0, 2]
         except:
@@ -107,11 +151,11 @@ def get_stock_data(stock_code):
         
         # 获取市盈率等估值指标
         try:
-            valuation = ak.stock_a_lg_indicator(symbol=full_code)
+            valuation = valuation_future.result()
             if not valuation.empty:
-                result["市盈率"] = float(valuation['pe'].iloc[0]) if not np.isnan(valuation['pe'].iloc[0]) else None
-                result["市净率"] = float(valuation['pb'].iloc[0]) if not np.isnan(valuation['pb'].iloc[0]) else None
-                result["市销率"] = float(valuation['ps'].iloc[0]) if not np.isnan(valuation['ps'].iloc[0]) else None
+                result["市盈率"] = _float_or_none(valuation['pe'].iloc[0])
+                result["市净率"] = _float_or_none(valuation['pb'].iloc[0])
+                result["市销率"] = _float_or_none(valuation['ps'].iloc[0])
         except:
             pass
         
@@ -128,4 +172,7 @@ def main(arg1: str, arg2: str) -> dict:
     """
     stock_code = arg1.strip()
     result = get_stock_data(stock_code)
-    return {"result": json.dumps(result, ensure_ascii=False)}
\ No newline at end of file
+    if orjson is not None:
+        return {"result": orjson.dumps(result).decode()}
+    # 与orjson相同的紧凑格式
+    return {"result": json.dumps(result, ensure_ascii=False, separators=(',', ':'))}
\ No newline at end of file
@@ -2,6 +2,12 @@ import requests
 import json
 from datetime import datetime
 
+# orjson为可选依赖，没有安装时使用标准库json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # 获取飞书应用Token和表格ID的步骤说明
 """
 1. 获取飞书应用Token（app_token）：
@@ -48,6 +54,9 @@ from datetime import datetime
 """
 
 class FeishuTableSync:
+    # batch_create接口单次最多写入500条记录
+    BATCH_SIZE = 500
+
     def __init__(self, app_token, table_id):
         self.app_token = app_token
         self.table_id = "tbloccdrRleM9Oa4"
@@ -56,39 +65,52 @@ class FeishuTableSync:
             'Authorization': f'Bearer {self.app_token}',
             'Content-Type': 'application/json'
         }
+        # 复用同一个连接，避免每次请求都重新握手
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+    
+    @staticmethod
+    def _encode(payload):
+        """把请求体序列化为UTF-8字节"""
+        if orjson is not None:
+            return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+        return json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    
+    def build_nikkei_record(self, market_data, position_data):
+        """构建一条日经ETF数据记录"""
+        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        
+        return {
+            'fields': {
+                '更新时间': current_time,
+                '日经指数变动': f"{market_data['nikkei_trend']} ({market_data['nikkei_change']:.2f}%)",
+                '周度变动': f"{market_data['nikkei_week_change']:.2f}%",
+                '价格区间': f"{market_data['nikkei_low']:.0f} - {market_data['nikkei_high']:.0f}",
+                '均价': f"{market_data['nikkei_avg']:.0f}",
+                'ETF涨跌幅': f"{market_data['etf_change']:.2f}%" if market_data['etf_change'] is not None else '获取失败',
+                'ETF周度涨跌': f"{market_data['etf_week_change']:.2f}%" if market_data['etf_week_change'] is not None else '获取失败',
+                '成交量比': f"{market_data['etf_volume_ratio']:.2f}" if market_data['etf_volume_ratio'] is not None else '获取失败',
+                '溢价率': f"{market_data['premium_rate']:.2f}%" if market_data['premium_rate'] is not None else '获取失败',
+                '日元汇率': f"{market_data['jpy_rate']:.4f}",
+                '汇率趋势': f"日元{market_data['jpy_trend']}",
+                '纳指变动': f"{market_data['nasdaq_change']:.2f}%",
+                '标普500变动': f"{market_data['sp500_change']:.2f}%",
+                '美股趋势': market_data['us_market_trend'],
+                '持仓成本': position_data['cost_price'],
+                '当前价格': position_data['current_price'] if position_data['current_price'] else '获取失败',
+                '持仓数量': position_data['position'],
+                '浮动盈亏': f"{position_data['profit_loss']:,.2f}元 ({position_data['profit_loss_rate']:.2f}%)" if position_data['profit_loss'] is not None else '无法计算'
+            }
+        }
     
     def sync_nikkei_data(self, market_data, position_data):
         """同步日经ETF数据到飞书多维表格"""
         try:
-            current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            
-            # 构建记录数据
-            record = {
-                'fields': {
-                    '更新时间': current_time,
-                    '日经指数变动': f"{market_data['nikkei_trend']} ({market_data['nikkei_change']:.2f}%)",
-                    '周度变动': f"{market_data['nikkei_week_change']:.2f}%",
-                    '价格区间': f"{market_data['nikkei_low']:.0f} - {market_data['nikkei_high']:.0f}",
-                    '均价': f"{market_data['nikkei_avg']:.0f}",
-                    'ETF涨跌幅': f"{market_data['etf_change']:.2f}%" if market_data['etf_change'] is not None else '获取失败',
-                    'ETF周度涨跌': f"{market_data['etf_week_change']:.2f}%" if market_data['etf_week_change'] is not None else '获取失败',
-                    '成交量比': f"{market_data['etf_volume_ratio']:.2f}" if market_data['etf_volume_ratio'] is not None else '获取失败',
-                    '溢价率': f"{market_data['premium_rate']:.2f}%" if market_data['premium_rate'] is not None else '获取失败',
-                    '日元汇率': f"{market_data['jpy_rate']:.4f}",
-                    '汇率趋势': f"日元{market_data['jpy_trend']}",
-                    '纳指变动': f"{market_data['nasdaq_change']:.2f}%",
-                    '标普500变动': f"{market_data['sp500_change']:.2f}%",
-                    '美股趋势': market_data['us_market_trend'],
-                    '持仓成本': position_data['cost_price'],
-                    '当前价格': position_data['current_price'] if position_data['current_price'] else '获取失败',
-                    '持仓数量': position_data['position'],
-                    '浮动盈亏': f"{position_data['profit_loss']:,.2f}元 ({position_data['profit_loss_rate']:.2f}%)" if position_data['profit_loss'] is not None else '无法计算'
-                }
-            }
+            record = self.build_nikkei_record(market_data, position_data)
             
             # 发送请求创建记录
             url = f"{self.base_url}{self.table_id}/records"
-            response = requests.post(url, headers=self.headers, json=record)
+            response = self.session.post(url, data=self._encode(record))
             
             if response.status_code == 200:
                 print("数据已成功同步到飞书多维表格")
@@ -99,4 +121,22 @@ class FeishuTableSync:
                 
         except Exception as e:
             print(f"同步数据时发生错误: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+    
+    def sync_nikkei_batch(self, records):
+        """批量写入记录，每BATCH_SIZE条调用一次batch_create"""
+        url = f"{self.base_url}{self.table_id}/records/batch_create"
+        success = True
+        for i in range(0, len(records), self.BATCH_SIZE):
+            chunk = records[i:i + self.BATCH_SIZE]
+            try:
+                response = self.session.post(url, data=self._encode({'records': chunk}))
+                if response.status_code == 200:
+                    print(f"已批量同步 {len(chunk)} 条数据到飞书多维表格")
+                else:
+                    print(f"批量同步数据失败: {response.status_code} - {response.text}")
+                    success = False
+            except Exception as e:
+                print(f"批量同步数据时发生错误: {str(e)}")
+                success = False
+        return success
@@ -1,9 +1,42 @@
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import pandas as pd
+import numpy as np
+
+# 仪表板布局中不随股票变化的部分，模块加载时构建一次，每次只填入标题和建议文字
+_DASHBOARD_LAYOUT = dict(
+    xaxis_title='日期',
+    yaxis_title='价格',
+    xaxis2_title='日期',
+    yaxis2_title='成交量',
+    showlegend=True
+)
+# 成交量柱的两色调色板：着色用0/1下标，序列化时每根柱只占一个字符，不必逐根写颜色字符串
+_VOLUME_MARKER = dict(colorscale=[[0, 'green'], [1, 'red']], cmin=0, cmax=1, showscale=False)
+_DASHBOARD_TITLE = {'y': 0.95, 'x': 0.5, 'xanchor': 'center', 'yanchor': 'top'}
+# 投资建议原先写在子图标题的位置上，继承了其居中、底部对齐的锚点，这里显式保留
+_SUGGESTION_ANNOTATION = dict(x=0.5, y=-0.15, xref="paper", yref="paper", xanchor="center", yanchor="bottom",
+                              showarrow=False, font=dict(size=14))
+_RULE_ANNOTATION = dict(
+    x=1.0,
+    xref="paper",
+    yref="paper",
+    showarrow=False,
+    align="right",
+    bgcolor="rgba(255,255,255,0.8)",
+    bordercolor="black",
+    borderwidth=1
+)
 
 def create_stock_dashboard(data, status, suggestion):
     """创建股票分析仪表板"""
+    # 各列只取一次NumPy数组，绘图和规则验证共用
+    dates = data.index
+    close = data['Close'].to_numpy()
+    ma20 = data['MA20'].to_numpy()
+    volume = data['Volume'].to_numpy()
+    vol120 = data['VOL120'].to_numpy()
+    
     # 创建子图
     fig = make_subplots(rows=2, cols=1, 
                        subplot_titles=('价格走势', '成交量分析'),
@@ -11,67 +44,41 @@ def create_stock_dashboard(data, status, suggestion):
                        row_heights=[0.7, 0.3])
 
     # 添加K线图
-    fig.add_trace(go.Candlestick(x=data.index,
-                                open=data['Open'],
-                                high=data['High'],
-                                low=data['Low'],
-                                close=data['Close'],
+    fig.add_trace(go.Candlestick(x=dates,
+                                open=data['Open'].to_numpy(),
+                                high=data['High'].to_numpy(),
+                                low=data['Low'].to_numpy(),
+                                close=close,
                                 name='K线'),
                  row=1, col=1)
 
-    # 添加20日均线
-    fig.add_trace(go.Scatter(x=data.index, 
-                            y=data['MA20'],
+    # 添加20日均线，均线用WebGL渲染，长历史下不再生成大量SVG节点
+    fig.add_trace(go.Scattergl(x=dates, 
+                            y=ma20,
                             name='20日均线',
                             line=dict(color='orange')),
                  row=1, col=1)
 
     # 添加成交量柱状图 - 根据是否高于均量线着色
-    colors = ['red' if vol > avg else 'green' for vol, avg in zip(data['Volume'], data['VOL120'])]
-    fig.add_trace(go.Bar(x=data.index,
-                        y=data['Volume'],
+    color_idx = (volume > vol120).astype(np.int8)
+    fig.add_trace(go.Bar(x=dates,
+                        y=volume,
                         name='成交量',
-                        marker_color=colors),
+                        marker=dict(_VOLUME_MARKER, color=color_idx)),
                  row=2, col=1)
 
     # 添加120日均量线
-    fig.add_trace(go.Scatter(x=data.index,
-                            y=data['VOL120'],
+    fig.add_trace(go.Scattergl(x=dates,
+                            y=vol120,
                             name='120日均量线',
                             line=dict(color='black', dash='dash')),
                  row=2, col=1)
 
-    # 更新布局
-    fig.update_layout(
-        title={
-            'text': f'股票分析仪表板 - 杨凯方法论分析结果: {status}',
-            'y':0.95,
-            'x':0.5,
-            'xanchor': 'center',
-            'yanchor': 'top'
-        },
-        xaxis_title='日期',
-        yaxis_title='价格',
-        xaxis2_title='日期',
-        yaxis2_title='成交量',
-        showlegend=True,
-        annotations=[
-            dict(
-                x=0.5,
-                y=-0.15,
-                xref="paper",
-                yref="paper",
-                text=f"投资建议: {suggestion}",
-                showarrow=False,
-                font=dict(size=14)
-            )
-        ]
-    )
-
-    # 添加杨凯方法论规则验证结果
-    price_above_ma20 = (data['Close'] > data['MA20']).rolling(4).min().iloc[-1] == 1
-    volume_above_vol120 = (data['Volume'] > data['VOL120']).rolling(3).min().iloc[-1] == 1
-    ma20_trend = data['MA20'].iloc[-1] > data['MA20'].iloc[-5]
+    # 杨凯方法论规则验证结果
+    # 只需要最后一个窗口，直接检查末尾N天是否全部满足，不必对整列做滚动最小值
+    price_above_ma20 = len(close) >= 4 and bool((close[-4:] > ma20[-4:]).all())
+    volume_above_vol120 = len(volume) >= 3 and bool((volume[-3:] > vol120[-3:]).all())
+    ma20_trend = len(ma20) >= 5 and bool(ma20[-1] > ma20[-5])
     
     rules_text = [
         f"规则1: 价格连续4天位于20日均线上方 - {'✓' if price_above_ma20 else '✗'}",
@@ -79,24 +86,26 @@ def create_stock_dashboard(data, status, suggestion):
         f"规则3: 20日均线呈上升趋势 - {'✓' if ma20_trend else '✗'}"
     ]
     
-    for i, text in enumerate(rules_text):
-        fig.add_annotation(
-            x=1.0,
-            y=0.95 - i*0.05,
-            xref="paper",
-            yref="paper",
-            text=text,
-            showarrow=False,
-            align="right",
-            bgcolor="rgba(255,255,255,0.8)",
-            bordercolor="black",
-            borderwidth=1
-        )
+    # 更新布局
+    fig.update_layout(
+        **_DASHBOARD_LAYOUT,
+        title={**_DASHBOARD_TITLE, 'text': f'股票分析仪表板 - 杨凯方法论分析结果: {status}'}
+    )
+    
+    # 投资建议和规则结果一次整体写入annotations，只做一次校验
+    # （子图标题本来就会被投资建议覆盖，整体替换后显示效果不变）
+    annotations = [{**_SUGGESTION_ANNOTATION, 'text': f"投资建议: {suggestion}"}]
+    annotations += [{**_RULE_ANNOTATION, 'y': 0.95 - i*0.05, 'text': text} for i, text in enumerate(rules_text)]
+    fig.layout.annotations = annotations
 
     return fig
 
 def create_analysis_dashboard(analyzer):
     """创建完整的分析仪表板"""
+    # 没有数据时不做规则分析和绘图，直接返回空图表
+    if analyzer.data is None or analyzer.data.empty:
+        return go.Figure(), "数据不足", ""
+    
     # 获取分析结果
     status, suggestion = analyzer.check_yang_kai_rules()
     
@@ -116,6 +125,10 @@ def create_stock_chart(data, title="股票走势图"):
     Returns:
         plotly.graph_objects.Figure: 完整的图表对象
     """
+    # 横轴用日期：取数函数返回的是带date列的默认整数索引，没有date列时才用索引
+    dates = data['date'] if 'date' in data.columns else data.index
+    
+    # 传入NumPy数组而不是Series，plotly直接序列化数组，省去逐个Series的校验转换
     # 创建子图
     fig = make_subplots(
         rows=2, cols=1,
@@ -128,11 +141,11 @@ def create_stock_chart(data, title="股票走势图"):
     # 添加K线图
     fig.add_trace(
         go.Candlestick(
-            x=data.index,
-            open=data['open'],
-            high=data['high'],
-            low=data['low'],
-            close=data['close'],
+            x=dates,
+            open=data['open'].to_numpy(),
+            high=data['high'].to_numpy(),
+            low=data['low'].to_numpy(),
+            close=data['close'].to_numpy(),
             name="K线"
         ),
         row=1, col=1
@@ -142,8 +155,8 @@ def create_stock_chart(data, title="股票走势图"):
     if 'KMJ1' in data.columns:
         fig.add_trace(
             go.Scatter(
-                x=data.index,
-                y=data['KMJ1'],
+                x=dates,
+                y=data['KMJ1'].to_numpy(),
                 name="KMJ1",
                 line=dict(color='blue')
             ),
@@ -153,8 +166,8 @@ def create_stock_chart(data, title="股票走势图"):
     if 'KMJ2' in data.columns:
         fig.add_trace(
             go.Scatter(
-                x=data.index,
-                y=data['KMJ2'],
+                x=dates,
+                y=data['KMJ2'].to_numpy(),
                 name="KMJ2",
                 line=dict(color='orange')
             ),
@@ -164,22 +177,22 @@ def create_stock_chart(data, title="股票走势图"):
     if 'KMJ3' in data.columns:
         fig.add_trace(
             go.Scatter(
-                x=data.index,
-                y=data['KMJ3'],
+                x=dates,
+                y=data['KMJ3'].to_numpy(),
                 name="KMJ3",
                 line=dict(color='red')
             ),
             row=1, col=1
         )
 
-    # 添加成交量图
-    colors = ['red' if row['close'] >= row['open'] else 'green' for idx, row in data.iterrows()]
+    # 添加成交量图 - 收阳红、收阴绿，整列一次比较
+    color_idx = (data['close'].to_numpy() >= data['open'].to_numpy()).astype(np.int8)
     fig.add_trace(
         go.Bar(
-            x=data.index,
-            y=data['volume'],
+            x=dates,
+            y=data['volume'].to_numpy(),
             name="成交量",
-            marker_color=colors
+            marker=dict(_VOLUME_MARKER, color=color_idx)
         ),
         row=2, col=1
     )
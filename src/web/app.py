@@ -7,6 +7,7 @@ import time
 from stock_data_fetcher import get_stock_list, get_stock_data
 from stock_indicators import calculate_signals, screen_stocks
 from stock_analyzer import analyze_stock, get_industry_stocks, get_industry_rank
+from src.utils.visualize import create_stock_chart
 
 # 必须是第一个 Streamlit 命令
 st.set_page_config(
@@ -28,6 +29,11 @@ st.markdown("""
 def load_stock_list():
     return get_stock_list()
 
+@st.cache_data(ttl=3600)
+def load_industries():
+    """行业下拉选项，随股票列表缓存，不必每次重跑都去重排序"""
+    return ['全部'] + sorted(load_stock_list()['industry'].unique().tolist())
+
 def main():
     st.title("自动荐股系统")
     
@@ -37,8 +43,8 @@ def main():
         
         # 获取行业列表
         try:
-            stocks_df = get_stock_list()
-            industries = ['全部'] + sorted(stocks_df['industry'].unique().tolist())
+            stocks_df = load_stock_list()
+            industries = load_industries()
         except Exception as e:
             st.error(f"获取股票列表失败: {str(e)}")
             return
@@ -93,11 +99,12 @@ def main():
                     height=600
                 )
                 
-                # 选择股票进行详细分析
+                # 选择股票进行详细分析，代码到名称先建好字典，每个选项直接查表
+                name_map = dict(zip(ranked_stocks['symbol'].to_numpy(), ranked_stocks['name'].to_numpy()))
                 selected_stock = st.selectbox(
                     "选择股票查看详细分析",
                     ranked_stocks['symbol'].tolist(),
-                    format_func=lambda x: f"{x} - {ranked_stocks[ranked_stocks['symbol'] == x]['name'].iloc[0]}",
+                    format_func=lambda x: f"{x} - {name_map[x]}",
                     key="stock_selector"  # 添加唯一的key
                 )
         except Exception as e:
@@ -123,11 +130,8 @@ def main():
                 st.markdown(f"### {stock_info['name']} ({selected_stock})")
                 st.markdown(analysis_result['analysis'])
                 
-                # 显示K线图
-                st.line_chart(stock_data[['close', 'KMJ2', 'KMJ3']])
-                
-                # 显示成交量
-                st.bar_chart(stock_data['volume'])
+                # K线、KMJ指标和成交量放在同一个Plotly图表里，一次发送、一次渲染
+                st.plotly_chart(create_stock_chart(stock_data, title=stock_info['name']), use_container_width=True)
                 
             except Exception as e:
                 st.error(f"分析股票失败: {str(e)}")
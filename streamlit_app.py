@@ -1,4 +1,5 @@
 import os
+import re
 import sys
 import streamlit as st
 import pandas as pd
@@ -34,6 +35,16 @@ INDUSTRY_CATEGORIES = {
     '其他': ['综合']
 }
 
+# 股票名称关键词正则，模块加载时编译一次
+_RE_BANK = re.compile('银行')
+_RE_SECURITIES = re.compile('证券')
+_RE_INSURANCE = re.compile('保险')
+_RE_REAL_ESTATE = re.compile('地产|房产|置业')
+_RE_PHARMA = re.compile('医药|生物|制药')
+_RE_COMM = re.compile('通信|电信|移动')
+_RE_ELECTRONICS = re.compile('电子|芯片|半导体')
+_RE_COMPUTER = re.compile('软件|网络|计算机')
+
 # 获取行业标准分类
 def get_industry_category(industry):
     """将行业名称映射到标准行业分类"""
@@ -86,45 +97,40 @@ def load_stock_list():
                     # 为空行业添加基本分类（根据股票代码特征）
                     mask_unknown = stocks_df['industry'].isin(['其他', '未知']) | stocks_df['industry'].isna()
                     
-                    # 使用字符串方法而不是正则表达式进行匹配
+                    # 使用预编译的正则进行匹配
                     # 银行股
                     bank_mask = mask_unknown & (
                         stocks_df['symbol'].str.startswith(('600', '601'), na=False) & 
-                        stocks_df['name'].str.contains('银行', na=False)
+                        stocks_df['name'].str.contains(_RE_BANK, na=False)
                     )
                     stocks_df.loc[bank_mask, 'industry'] = '银行'
                     
                     # 券商股
-                    securities_mask = mask_unknown & stocks_df['name'].str.contains('证券', na=False)
+                    securities_mask = mask_unknown & stocks_df['name'].str.contains(_RE_SECURITIES, na=False)
                     stocks_df.loc[securities_mask, 'industry'] = '证券'
                     
                     # 保险股
-                    insurance_mask = mask_unknown & stocks_df['name'].str.contains('保险', na=False)
+                    insurance_mask = mask_unknown & stocks_df['name'].str.contains(_RE_INSURANCE, na=False)
                     stocks_df.loc[insurance_mask, 'industry'] = '保险'
                     
                     # 房地产
-                    real_estate_keywords = ['地产', '房产', '置业']
-                    real_estate_mask = mask_unknown & stocks_df['name'].str.contains('|'.join(real_estate_keywords), na=False)
+                    real_estate_mask = mask_unknown & stocks_df['name'].str.contains(_RE_REAL_ESTATE, na=False)
                     stocks_df.loc[real_estate_mask, 'industry'] = '房地产'
                     
                     # 医药生物
-                    pharma_keywords = ['医药', '生物', '制药']
-                    pharma_mask = mask_unknown & stocks_df['name'].str.contains('|'.join(pharma_keywords), na=False)
+                    pharma_mask = mask_unknown & stocks_df['name'].str.contains(_RE_PHARMA, na=False)
                     stocks_df.loc[pharma_mask, 'industry'] = '医药生物'
                     
                     # 通信
-                    comm_keywords = ['通信', '电信', '移动']
-                    comm_mask = mask_unknown & stocks_df['name'].str.contains('|'.join(comm_keywords), na=False)
+                    comm_mask = mask_unknown & stocks_df['name'].str.contains(_RE_COMM, na=False)
                     stocks_df.loc[comm_mask, 'industry'] = '通信'
                     
                     # 电子
-                    electronics_keywords = ['电子', '芯片', '半导体']
-                    electronics_mask = mask_unknown & stocks_df['name'].str.contains('|'.join(electronics_keywords), na=False)
+                    electronics_mask = mask_unknown & stocks_df['name'].str.contains(_RE_ELECTRONICS, na=False)
                     stocks_df.loc[electronics_mask, 'industry'] = '电子'
                     
                     # 计算机
-                    computer_keywords = ['软件', '网络', '计算机']
-                    computer_mask = mask_unknown & stocks_df['name'].str.contains('|'.join(computer_keywords), na=False)
+                    computer_mask = mask_unknown & stocks_df['name'].str.contains(_RE_COMPUTER, na=False)
                     stocks_df.loc[computer_mask, 'industry'] = '计算机'
                     
                     # 添加行业分类列
@@ -143,15 +149,18 @@ def load_stock_list():
                     sample_stocks = stocks_df[stocks_df['symbol'].str.startswith(('000', '600'), na=False)].head(30)
                     logger.info(f"Calculating technical scores for {len(sample_stocks)} stocks")
                     
-                    for idx, row in sample_stocks.iterrows():
+                    scores = {}
+                    for ts_code in sample_stocks['ts_code'].to_numpy():
                         try:
-                            data = get_stock_data(row['ts_code'], days=30)
+                            data = get_stock_data(ts_code, days=30)
                             if data is not None and not data.empty:
-                                score = calculate_technical_score(data)
-                                stocks_df.loc[stocks_df['ts_code'] == row['ts_code'], 'technical_score'] = score
-                                logger.info(f"Calculated score for {row['ts_code']}: {score}")
+                                scores[ts_code] = calculate_technical_score(data)
+                                logger.info(f"Calculated score for {ts_code}: {scores[ts_code]}")
                         except Exception as e:
-                            logger.error(f"Error calculating score for {row['ts_code']}: {str(e)}")
+                            logger.error(f"Error calculating score for {ts_code}: {str(e)}")
+                    
+                    # 一次性写回得分，避免每只股票都对全表做一次布尔索引赋值
+                    stocks_df['technical_score'] = stocks_df['ts_code'].map(scores).fillna(stocks_df['technical_score'])
                     
                     logger.info("Finished calculating technical scores")
                 except Exception as e:
@@ -175,45 +184,53 @@ def calculate_technical_score(data):
         if data is None or data.empty:
             return 0.0
             
+        # 不足6天的数据算不出动量和量能，直接给基础分
+        if len(data) < 6:
+            return 50.0
+            
         # 确保KMJ指标已计算
         if 'KMJ1' not in data.columns:
             data = calculate_kmj_indicators(data)
             
-        # 获取最新的数据
-        latest = data.iloc[-1]
+        # 用到的列一次性取成NumPy数组，后面只做标量读取和切片
+        columns = data.columns
+        close = data['close'].to_numpy(dtype=np.float64)
         
         # 基础分数为50分
         score = 50.0
         
         # 趋势得分 (最高30分)
-        if 'KMJ_TREND' in latest:
-            if latest['KMJ_TREND'] == 1:  # 上涨趋势
+        if 'KMJ_TREND' in columns:
+            trend = data['KMJ_TREND'].to_numpy()[-1]
+            if trend == 1:  # 上涨趋势
                 score += 30
-            elif latest['KMJ_TREND'] == -1:  # 下跌趋势
+            elif trend == -1:  # 下跌趋势
                 score -= 20
                 
         # KMJ指标得分 (最高20分)
-        if 'KMJ2' in latest and 'KMJ3' in latest:
+        if 'KMJ2' in columns and 'KMJ3' in columns:
             # KMJ2与KMJ3的距离，距离越大表示趋势越强
-            kmj_diff = abs(latest['KMJ2'] - latest['KMJ3']) / latest['KMJ3'] * 100
+            kmj2 = data['KMJ2'].to_numpy(dtype=np.float64)[-1]
+            kmj3 = data['KMJ3'].to_numpy(dtype=np.float64)[-1]
+            kmj_diff = abs(kmj2 - kmj3) / kmj3 * 100
             kmj_score = min(20, kmj_diff)
             score += kmj_score
             
         # 动量得分 (最高20分)
-        if len(data) > 5:
-            # 最近5天的涨幅
-            price_change = (latest['close'] / data.iloc[-6]['close'] - 1) * 100
-            if price_change > 0:
-                score += min(20, price_change)
+        # 最近5天的涨幅，下跌时扣分
+        price_change = (close[-1] / close[-6] - 1) * 100
+        if price_change > 0:
+            score += min(20, price_change)
         else:
-                score -= min(20, abs(price_change))
+            score -= min(20, abs(price_change))
                 
         # 成交量得分 (最高10分)
-        if 'volume' in data.columns and len(data) > 5:
+        if 'volume' in columns:
+            volume = data['volume'].to_numpy(dtype=np.float64)
             # 最近5天的平均成交量
-            avg_vol = data['volume'].tail(5).mean()
+            avg_vol = np.nanmean(volume[-5:])
             # 与前5天平均成交量相比
-            prev_avg_vol = data['volume'].iloc[-10:-5].mean() if len(data) > 10 else data['volume'].mean()
+            prev_avg_vol = np.nanmean(volume[-10:-5]) if len(volume) > 10 else np.nanmean(volume)
             
             if not np.isnan(avg_vol) and not np.isnan(prev_avg_vol) and prev_avg_vol > 0:
                 vol_change = (avg_vol / prev_avg_vol - 1) * 100
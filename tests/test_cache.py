@@ -0,0 +1,34 @@
+import os
+import tempfile
+import unittest
+from src.utils.cache import FileCache
+
+class TestFileCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = FileCache('test', cache_dir=self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_set_prunes_older_trade_dates(self):
+        """写入新交易日的数据时清理更早交易日的条目"""
+        self.cache.set('600000_30_20240102', 1)
+        self.cache.set('20240102', 2)
+        self.cache.set('600000', 3)
+        self.cache.set('600000_30_20240103', 4)
+        self.assertIsNone(self.cache.get('600000_30_20240102'))
+        self.assertIsNone(self.cache.get('20240102'))
+        self.assertEqual(self.cache.get('600000'), 3)
+        self.assertEqual(self.cache.get('600000_30_20240103'), 4)
+
+    def test_prune_keeps_current_trade_date(self):
+        """prune只删除早于给定交易日的条目，写入更早交易日的数据不会触发清理"""
+        self.cache.set('000002_20240104', 2)
+        self.cache.set('000001_20240103', 1)
+        self.assertEqual(self.cache.get('000001_20240103'), 1)
+        self.assertEqual(self.cache.prune('20240104'), 1)
+        self.assertEqual(os.listdir(self.cache.directory), ['000002_20240104.pkl'])
+
+if __name__ == '__main__':
+    unittest.main()
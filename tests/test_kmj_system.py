@@ -8,9 +8,10 @@ import sys
 project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 
-from src.core.kmj_indicator import calculate_kmj_indicators, get_kmj_signals
+from src.core.kmj_indicator import calculate_kmj_indicators, calculate_kmj_indicators_batch, get_kmj_signals
 from src.core.stock_data_fetcher import get_stock_data
 from src.core.stock_analyzer import calculate_technical_score
+from src.analysis import stock_analyzer as analysis
 
 class TestKMJSystem(unittest.TestCase):
     @classmethod
@@ -48,6 +49,31 @@ class TestKMJSystem(unittest.TestCase):
         self.assertTrue(all(pd.isna(data['KMJ3'][:24])))
         self.assertTrue(all(~pd.isna(data['KMJ3'][24:])))
 
+    def test_kmj_indicators_batch(self):
+        """测试批量计算KMJ指标与逐只计算一致"""
+        # 两只股票拼成长表，第二只数据不足20天
+        first = self.test_data.assign(code='000001')
+        second = self.test_data.head(15).assign(code='600000')
+        data = calculate_kmj_indicators_batch(pd.concat([first, second], ignore_index=True))
+        
+        for code, single in [('000001', first), ('600000', second)]:
+            expected = calculate_kmj_indicators(single)
+            result = data[data['code'] == code]
+            for col in ['KMJ1', 'KMJ2', 'KMJ3']:
+                np.testing.assert_allclose(result[col].to_numpy(), expected[col].to_numpy())
+            np.testing.assert_array_equal(result['KMJ_TREND'].to_numpy(), expected['KMJ_TREND'].to_numpy())
+
+    def test_analysis_batch_scores(self):
+        """测试分析模块批量计算技术得分与逐只计算一致"""
+        # 两只股票的行交错排列，第二只数据不足25天
+        first = self.test_data.assign(code='000001')
+        second = self.test_data.head(20).assign(code='600000')
+        data = pd.concat([first, second]).sort_values('date', kind='stable', ignore_index=True)
+        scores = analysis.calculate_technical_scores(data)
+        
+        self.assertEqual(scores['000001'], analysis.calculate_technical_score(self.test_data.copy()))
+        self.assertEqual(scores['600000'], 0)
+
     def test_kmj_signals(self):
         """测试KMJ信号生成"""
         # 计算KMJ指标和信号
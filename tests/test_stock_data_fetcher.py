@@ -4,9 +4,14 @@ import numpy as np
 from src.core.stock_data_fetcher import get_stock_list, get_stock_data
 
 class TestStockDataFetcher(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """股票列表只获取一次，各测试共用"""
+        cls.stocks = get_stock_list()
+        
     def test_stock_list_structure(self):
         """测试股票列表的数据结构"""
-        stocks = get_stock_list()
+        stocks = self.stocks
         self.assertIsInstance(stocks, pd.DataFrame)
         required_columns = ['symbol', 'name']
         for col in required_columns:
@@ -14,14 +19,16 @@ class TestStockDataFetcher(unittest.TestCase):
             
     def test_stock_code_format(self):
         """测试股票代码格式"""
-        stocks = get_stock_list()
+        stocks = self.stocks
         if len(stocks) > 0:
-            # 测试股票代码格式
-            self.assertTrue(all(stocks['symbol'].str.match(r'^\d{6}$')))
+            # 测试股票代码格式：6位数字，转成定长字符串数组后用NumPy的字符串函数判断，不走正则
+            # 不指定'<U6'，否则超长的代码会被截断而误判为合法
+            codes = stocks['symbol'].to_numpy().astype(str)
+            self.assertTrue(bool(np.all(np.char.str_len(codes) == 6)) and bool(np.all(np.char.isdigit(codes))))
             
     def test_stock_data_structure(self):
         """测试股票数据结构"""
-        stocks = get_stock_list()
+        stocks = self.stocks
         if len(stocks) > 0:
             # 测试第一个股票的数据
             test_stock = stocks.iloc[0]['symbol']
@@ -46,11 +53,16 @@ class TestStockDataFetcher(unittest.TestCase):
             self.assertFalse(data.empty)
             
 def run_tests():
-    """运行所有测试"""
+    """运行所有测试；安装了pytest-xdist时多进程并行运行，各测试的网络等待互相重叠"""
     print("Starting automated tests...")
-    test_suite = unittest.TestLoader().loadTestsFromTestCase(TestStockDataFetcher)
-    test_result = unittest.TextTestRunner(verbosity=2).run(test_suite)
-    return test_result.wasSuccessful()
+    try:
+        import pytest
+        import xdist  # noqa: F401
+    except ImportError:
+        test_suite = unittest.TestLoader().loadTestsFromTestCase(TestStockDataFetcher)
+        test_result = unittest.TextTestRunner(verbosity=2).run(test_suite)
+        return test_result.wasSuccessful()
+    return pytest.main(['-n', 'auto', '-v', __file__]) == 0
 
 if __name__ == '__main__':
     run_tests() 
\ No newline at end of file